@@ -0,0 +1,227 @@
+"""
+Batched GUI-Actor inference.
+
+Mirrors ``gui_actor.inference.inference(..., use_placeholder=True)`` but runs a
+list of conversations through one padded forward pass. With the pointer
+placeholder already in the prompt only the prefill hidden states are needed, so
+no tokens are generated and the LM head is never applied.
+
+Image preprocessing and the vision tower run separately from the language
+model so their outputs can be cached per screenshot: a repeated image only
+pays for the language side of the forward pass. Several instructions on the
+same screenshot can share one encoded system-prompt + image prefix
+(``shared_prefix_inference``).
+"""
+
+import torch
+from gui_actor.constants import chat_template
+from gui_actor.inference import get_prediction_region_point
+
+from caching import pixel_digest
+from metrics import stage
+
+ASSISTANT_STARTER = "<|im_start|>assistant<|recipient|>os\npyautogui.click(<|pointer_start|><|pointer_pad|><|pointer_end|>)"
+
+
+def pointer_prediction(attn_scores, n_width, n_height, topk=3):
+    """Turn pointer-head attention scores into the ``pred`` dict ``inference()`` returns"""
+    _, region_points, region_scores, region_points_all = get_prediction_region_point(
+        attn_scores, n_width, n_height, return_all_regions=True, rect_center=False
+    )
+    return {
+        "n_width": n_width,
+        "n_height": n_height,
+        # Kept as an array; rendering works on it directly instead of Python lists
+        "attn_scores": attn_scores.float().cpu().numpy(),
+        "topk_points": region_points[:topk],
+        "topk_values": region_scores[:topk],
+        "topk_points_all": region_points_all[:topk],
+    }
+
+
+def conversation_image(conversation):
+    """Return the image content item of a grounding conversation"""
+    for message in conversation:
+        for item in message["content"]:
+            if item.get("type") == "image":
+                return item
+    raise ValueError("Conversation has no image")
+
+
+def encode_images(conversations, model, data_processor, vision_cache=None):
+    """Return one ``{"image_grid_thw", "image_embeds"}`` dict per conversation.
+
+    Features are looked up in ``vision_cache`` by pixel hash. Only misses go
+    through the processor and the vision tower, as a single batch; duplicates
+    within the batch are encoded once. The processor's ``pixel_values`` are not
+    cached since the vision-tower output supersedes them.
+
+    The server already resizes screenshots to the patch grid, so the processor
+    is told not to resample them again; other sizes get the processor's resize.
+    """
+    keys = []
+    for conversation in conversations:
+        item = conversation_image(conversation)
+        keys.append(item.get("image_key") or pixel_digest(item["image"]))
+
+    features = {}
+    missing = {}
+    for i, key in enumerate(keys):
+        if key in features or key in missing:
+            continue
+        cached = vision_cache.get(key) if vision_cache is not None else None
+        if cached is None:
+            missing[key] = i
+        else:
+            features[key] = cached
+
+    if missing:
+        images = [conversation_image(conversations[i])["image"] for i in missing.values()]
+        factor = data_processor.image_processor.patch_size * data_processor.image_processor.merge_size
+        aligned = all(image.width % factor == 0 and image.height % factor == 0 for image in images)
+        with stage("preprocess"):
+            processed = data_processor.image_processor(images=images, do_resize=not aligned, return_tensors="pt")
+        grids = processed["image_grid_thw"].to(model.device)
+        pixel_values = processed["pixel_values"].to(model.device, dtype=model.visual.dtype)
+        image_embeds = model.visual(pixel_values, grid_thw=grids)
+        counts = (grids.prod(-1) // model.visual.spatial_merge_size ** 2).tolist()
+        for key, grid, embeds in zip(missing, grids, image_embeds.split(counts)):
+            features[key] = {"image_grid_thw": grid, "image_embeds": embeds}
+            if vision_cache is not None:
+                vision_cache.put(key, features[key])
+
+    return [features[key] for key in keys]
+
+
+@torch.inference_mode()
+def batch_inference(conversations, model, tokenizer, data_processor, topk=3, vision_cache=None):
+    """Run several grounding conversations as one padded batch, one pred per conversation"""
+    features = encode_images(conversations, model, data_processor, vision_cache)
+    merge_size = model.visual.spatial_merge_size
+
+    # Expand each image placeholder to its number of vision tokens, as the processor would
+    image_token = data_processor.image_token
+    texts = []
+    with stage("preprocess"):
+        for conversation, feature in zip(conversations, features):
+            text = data_processor.apply_chat_template(
+                conversation, tokenize=False, add_generation_prompt=False, chat_template=chat_template
+            ) + ASSISTANT_STARTER
+            n_tokens = int(feature["image_grid_thw"].prod()) // merge_size ** 2
+            texts.append(text.replace(image_token, image_token * n_tokens, 1))
+        inputs = tokenizer(texts, padding=True, return_tensors="pt").to(model.device)
+    input_ids, attention_mask = inputs["input_ids"], inputs["attention_mask"]
+    image_grid_thw = torch.stack([feature["image_grid_thw"] for feature in features])
+
+    # Merge the (possibly cached) vision features into the text embeddings and run only the decoder
+    inputs_embeds = model.get_input_embeddings()(input_ids)
+    image_mask = (input_ids == model.config.image_token_id).unsqueeze(-1).expand_as(inputs_embeds)
+    image_embeds = torch.cat([feature["image_embeds"] for feature in features]).to(inputs_embeds.dtype)
+    inputs_embeds = inputs_embeds.masked_scatter(image_mask, image_embeds)
+    # By keyword: in Qwen2.5-VL the fourth positional parameter is second_per_grid_ts
+    position_ids, _ = model.get_rope_index(input_ids, image_grid_thw, attention_mask=attention_mask)
+
+    outputs = model.model(
+        inputs_embeds=inputs_embeds,
+        attention_mask=attention_mask,
+        position_ids=position_ids,
+        use_cache=False,
+    )
+    last_hidden = outputs.last_hidden_state
+
+    preds = []
+    for i, feature in enumerate(features):
+        pointer_hidden = last_hidden[i][input_ids[i] == model.config.pointer_pad_token_id]
+        attn_scores, _ = model.multi_patch_pointer_head(feature["image_embeds"], pointer_hidden)
+        _, n_height, n_width = (feature["image_grid_thw"] // merge_size).tolist()
+        preds.append(pointer_prediction(attn_scores, n_width, n_height, topk))
+    return preds
+
+
+def _split_prefix(text, marker="<|vision_end|>"):
+    """Split a rendered prompt just after the image so the prefix can be shared"""
+    cut = text.index(marker) + len(marker)
+    return text[:cut], text[cut:]
+
+
+@torch.inference_mode()
+def shared_prefix_inference(conversations, model, tokenizer, data_processor, topk=3, vision_cache=None):
+    """Ground several instructions on the same screenshot, one pred per conversation.
+
+    The conversations must differ only in their instruction text. The system
+    prompt and image are encoded once; their KV cache is then repeated across
+    the batch and only the per-instruction suffixes run through the decoder.
+    """
+    feature = encode_images(conversations[:1], model, data_processor, vision_cache)[0]
+    merge_size = model.visual.spatial_merge_size
+    n_image_tokens = int(feature["image_grid_thw"].prod()) // merge_size ** 2
+    n = len(conversations)
+
+    prefix_text, suffix_texts = None, []
+    for conversation in conversations:
+        text = data_processor.apply_chat_template(
+            conversation, tokenize=False, add_generation_prompt=False, chat_template=chat_template
+        ) + ASSISTANT_STARTER
+        prefix, suffix = _split_prefix(text)
+        if prefix_text is not None and prefix != prefix_text:
+            raise ValueError("Conversations do not share the same system prompt and image")
+        prefix_text = prefix
+        suffix_texts.append(suffix)
+
+    image_token = data_processor.image_token
+    prefix_text = prefix_text.replace(image_token, image_token * n_image_tokens, 1)
+    prefix_ids = tokenizer(prefix_text, return_tensors="pt")["input_ids"].to(model.device)
+    prefix_len = prefix_ids.shape[1]
+
+    # Left-pad suffixes: flash-attention rejects right padding when a KV cache is used.
+    # The pads sit between the prefix and each row's real tokens; they are masked out
+    # and get no rope positions, so every row still continues the prefix directly.
+    suffix_ids = [tokenizer(suffix)["input_ids"] for suffix in suffix_texts]
+    suffix_len = max(len(ids) for ids in suffix_ids)
+    pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+    suffix_mask = torch.tensor(
+        [[0] * (suffix_len - len(ids)) + [1] * len(ids) for ids in suffix_ids], device=model.device
+    )
+    suffix_ids = torch.tensor(
+        [[pad_id] * (suffix_len - len(ids)) + ids for ids in suffix_ids], device=model.device
+    )
+
+    full_ids = torch.cat([prefix_ids.expand(n, -1), suffix_ids], dim=1)
+    full_mask = torch.cat([torch.ones_like(prefix_ids).expand(n, -1), suffix_mask], dim=1)
+    position_ids, _ = model.get_rope_index(
+        full_ids, feature["image_grid_thw"].unsqueeze(0).expand(n, -1), attention_mask=full_mask
+    )
+
+    # Prefix: system prompt + image, once
+    embed_tokens = model.get_input_embeddings()
+    prefix_embeds = embed_tokens(prefix_ids)
+    image_mask = (prefix_ids == model.config.image_token_id).unsqueeze(-1).expand_as(prefix_embeds)
+    prefix_embeds = prefix_embeds.masked_scatter(image_mask, feature["image_embeds"].to(prefix_embeds.dtype))
+    prefix_out = model.model(
+        inputs_embeds=prefix_embeds,
+        attention_mask=full_mask[:1, :prefix_len],
+        position_ids=position_ids[:, :1, :prefix_len],
+        use_cache=True,
+    )
+    past_key_values = prefix_out.past_key_values
+    if n > 1:
+        past_key_values.batch_repeat_interleave(n)
+
+    # Suffixes: instruction + pointer placeholder, batched against the shared KV cache
+    suffix_out = model.model(
+        inputs_embeds=embed_tokens(suffix_ids),
+        attention_mask=full_mask,
+        position_ids=position_ids[:, :, prefix_len:],
+        past_key_values=past_key_values,
+        cache_position=torch.arange(prefix_len, prefix_len + suffix_len, device=model.device),
+        use_cache=True,
+    )
+    last_hidden = suffix_out.last_hidden_state
+
+    _, n_height, n_width = (feature["image_grid_thw"] // merge_size).tolist()
+    preds = []
+    for i in range(n):
+        pointer_hidden = last_hidden[i][suffix_ids[i] == model.config.pointer_pad_token_id]
+        attn_scores, _ = model.multi_patch_pointer_head(feature["image_embeds"], pointer_hidden)
+        preds.append(pointer_prediction(attn_scores, n_width, n_height, topk))
+    return preds
@@ -0,0 +1,149 @@
+"""
+Dynamic micro-batching scheduler for model inference.
+
+Concurrent callers submit single items; a dedicated worker thread gathers them
+inside a short window (``max_batch_size`` items or ``max_wait_ms``, whichever
+comes first), runs them through ``run_batch`` as one batch and fans the results
+back out to each caller's future.
+"""
+
+import math
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+
+class QueueFullError(RuntimeError):
+    """Raised by ``submit`` when the bounded queue is full"""
+
+    def __init__(self, queue_depth: int, retry_after: int):
+        super().__init__(f"Inference queue is full ({queue_depth} pending)")
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+
+
+class _Pending:
+    __slots__ = ("item", "future", "enqueued_at")
+
+    def __init__(self, item: Any):
+        self.item = item
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """Collects concurrent requests into batches for a batched ``run_batch`` callable.
+
+    ``run_batch`` receives a list of items and must return a list of results of
+    the same length. A result that is an ``Exception`` instance is raised to that
+    caller only. If the whole batch raises, every item is retried on its own so
+    one bad input does not fail the requests it was batched with.
+
+    When ``max_queue_size`` is set, ``submit`` rejects new work with
+    ``QueueFullError`` instead of letting the backlog (and latency) grow without
+    bound.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_queue_size: int = 0,
+        name: str = "inference-batcher",
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue_size = max(0, int(max_queue_size))
+        self.name = name
+        self._queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.batch_sizes: Counter = Counter()
+        self.rejected = 0
+        # Moving average of batch run time, used to estimate Retry-After
+        self.avg_batch_seconds = 0.0
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item and return a future resolved with its result."""
+        if self._thread is None:
+            raise RuntimeError(f"{self.name} is not running")
+        depth = self._queue.qsize()
+        if self.max_queue_size and depth >= self.max_queue_size:
+            self.rejected += 1
+            raise QueueFullError(depth, self.retry_after(depth))
+        pending = _Pending(item)
+        self._queue.put(pending)
+        return pending.future
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def retry_after(self, depth: int) -> int:
+        """Seconds until a queue of ``depth`` items is expected to drain"""
+        batches_ahead = depth / self.max_batch_size + 1
+        return max(1, math.ceil(batches_ahead * self.avg_batch_seconds))
+
+    def _collect(self, first: _Pending) -> List[_Pending]:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                pending = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is None:
+                # Shutdown sentinel: finish this batch, then exit
+                self._queue.put(None)
+                break
+            batch.append(pending)
+        return batch
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            batch = [p for p in batch if p.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self.batch_sizes[len(batch)] += 1
+            started = time.perf_counter()
+            results = self._run([p.item for p in batch])
+            elapsed = time.perf_counter() - started
+            self.avg_batch_seconds = elapsed if not self.avg_batch_seconds else 0.8 * self.avg_batch_seconds + 0.2 * elapsed
+            for pending, result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    pending.future.set_exception(result)
+                else:
+                    pending.future.set_result(result)
+
+    def _run(self, items: List[Any]) -> List[Any]:
+        try:
+            results = self.run_batch(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"run_batch returned {len(results)} results for {len(items)} items")
+            return results
+        except Exception as e:
+            if len(items) == 1:
+                return [e]
+        # Isolate the failing item(s) by re-running one at a time
+        return [self._run([item])[0] for item in items]
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Micro-batching benchmark with a stub model on CPU.
+
+The stub charges a fixed cost per forward pass plus a smaller cost per item,
+which is how a GPU forward pass over a padded batch behaves. Requests arrive
+open-loop at a fixed rate, and throughput plus p50/p99 latency are compared
+between batch size 1 and the batched scheduler.
+
+Usage:
+    python -m benchmarks.bench_batching --rps 40 --requests 400 --max-batch-size 8
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from batching import MicroBatcher
+from benchmarks.common import percentile
+
+
+class StubBatchModel:
+    """Sleeps ``base_ms + per_item_ms * len(batch)`` and returns a fixed prediction"""
+
+    def __init__(self, base_ms: float = 60.0, per_item_ms: float = 8.0):
+        self.base_ms = base_ms
+        self.per_item_ms = per_item_ms
+
+    def __call__(self, items):
+        time.sleep((self.base_ms + self.per_item_ms * len(items)) / 1000.0)
+        return [{"topk_points": [(0.5, 0.5)]} for _ in items]
+
+
+async def run_load(batcher: MicroBatcher, rps: float, n_requests: int):
+    latencies = []
+
+    async def one(i):
+        start = time.perf_counter()
+        await asyncio.wrap_future(batcher.submit(i))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    tasks = []
+    for i in range(n_requests):
+        # Open loop: arrivals do not wait for earlier requests to finish
+        delay = start + i / rps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(i)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput_rps": n_requests / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "batch_sizes": dict(sorted(batcher.batch_sizes.items())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the inference micro-batcher with a stub model")
+    parser.add_argument("--rps", type=float, default=40.0, help="Open-loop arrival rate (default: 40)")
+    parser.add_argument("--requests", type=int, default=400, help="Requests per run (default: 400)")
+    parser.add_argument("--max-batch-size", type=int, default=8, help="Batched run max batch size (default: 8)")
+    parser.add_argument("--max-wait-ms", type=float, default=10.0, help="Batching window in ms (default: 10)")
+    parser.add_argument("--base-ms", type=float, default=60.0, help="Stub cost per forward pass (default: 60)")
+    parser.add_argument("--per-item-ms", type=float, default=8.0, help="Stub cost per batch item (default: 8)")
+    args = parser.parse_args()
+
+    report = {}
+    for label, max_batch_size in (("batch_size_1", 1), ("batched", args.max_batch_size)):
+        batcher = MicroBatcher(
+            StubBatchModel(args.base_ms, args.per_item_ms),
+            max_batch_size=max_batch_size,
+            max_wait_ms=args.max_wait_ms,
+        ).start()
+        try:
+            report[label] = asyncio.run(run_load(batcher, args.rps, args.requests))
+        finally:
+            batcher.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
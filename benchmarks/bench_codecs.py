@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Output image codec benchmark: encode time and payload size per codec.
+
+Encodes the click-point overlay and the attention map of a synthetic
+screenshot at our usual resolutions with every codec setting the server
+supports.
+
+Usage:
+    python -m benchmarks.bench_codecs --resolutions 720p 900p 1080p
+"""
+
+import argparse
+import base64
+import json
+
+from benchmarks.common import RESOLUTIONS, synthetic_screenshot, time_call
+from main import draw_point, get_attn_map, image_to_bytes
+
+CODEC_SETTINGS = [
+    {"codec": "png", "quality": 80, "compress_level": 6},
+    {"codec": "png", "quality": 80, "compress_level": 1},
+    {"codec": "png", "quality": 80, "compress_level": 0},
+    {"codec": "webp", "quality": 80, "compress_level": 1},
+    {"codec": "webp", "quality": 60, "compress_level": 1},
+    {"codec": "jpeg", "quality": 90, "compress_level": 1},
+    {"codec": "jpeg", "quality": 75, "compress_level": 1},
+]
+
+
+def label(codec):
+    if codec["codec"] == "png":
+        return f"png(compress_level={codec['compress_level']})"
+    return f"{codec['codec']}(quality={codec['quality']})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark overlay encoding per codec")
+    parser.add_argument("--resolutions", nargs="+", default=["720p", "900p", "1080p"], choices=sorted(RESOLUTIONS))
+    parser.add_argument("--repeat", type=int, default=5, help="Encodes per measurement, median reported (default: 5)")
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        screenshot = synthetic_screenshot(width, height)
+        # Same score grid as the model: one cell per 28x28 pixels
+        n_width, n_height = width // 28, height // 28
+        scores = [[((i % n_width) * (i // n_width)) / (n_width * n_height) for i in range(n_width * n_height)]]
+        images = {
+            "image_with_point": draw_point(screenshot, (width * 0.4, height * 0.6)),
+            "attention_map": get_attn_map(screenshot, scores, n_width, n_height),
+        }
+        report[name] = {}
+        for codec in CODEC_SETTINGS:
+            row = {}
+            for kind, image in images.items():
+                ms, (data, _) = time_call(lambda: image_to_bytes(image, codec), args.repeat)
+                row[kind] = {
+                    "encode_ms": round(ms, 2),
+                    "bytes": len(data),
+                    "base64_bytes": len(base64.b64encode(data)),
+                }
+            report[name][label(codec)] = row
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
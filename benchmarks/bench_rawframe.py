@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Input format benchmark: PNG upload vs raw pixel frames, per frame.
+
+Starts from a BGRA capture buffer (what mss and most screen grabbers return)
+and measures the client-side encode plus the server-side decode to an RGB
+image, with the payload size, for PNG and for raw frames (uncompressed, and
+LZ4/zstd when those packages are installed).
+
+Usage:
+    python -m benchmarks.bench_rawframe --resolutions 1080p 1440p 4k
+"""
+
+import argparse
+import io
+import json
+
+import numpy as np
+from PIL import Image
+
+import rawframe
+from benchmarks.common import RESOLUTIONS, synthetic_screenshot, time_call
+from main import decode_image
+
+
+def bgra_capture(width, height):
+    rgb = np.asarray(synthetic_screenshot(width, height))
+    bgra = np.empty((height, width, 4), dtype=np.uint8)
+    bgra[..., :3] = rgb[..., ::-1]
+    bgra[..., 3] = 255
+    return bgra
+
+
+def png_encode(bgra, compress_level):
+    image = Image.frombuffer("RGB", (bgra.shape[1], bgra.shape[0]), bgra, "raw", "BGRX", 0, 1)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=compress_level)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PNG vs raw frame input, encode + decode per frame")
+    parser.add_argument("--resolutions", nargs="+", default=["1080p", "1440p", "4k"], choices=sorted(RESOLUTIONS))
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement, median reported (default: 5)")
+    args = parser.parse_args()
+
+    compressions = [None] + [c for c in ("lz4", "zstd") if (rawframe.lz4_frame if c == "lz4" else rawframe.zstandard)]
+    report = {}
+    for name in args.resolutions:
+        bgra = bgra_capture(*RESOLUTIONS[name])
+        rows = {}
+        for level in (6, 1):
+            encode_ms, payload = time_call(lambda: png_encode(bgra, level), args.repeat)
+            decode_ms, _ = time_call(lambda: decode_image(payload), args.repeat)
+            rows[f"png(compress_level={level})"] = (encode_ms, decode_ms, len(payload))
+        for compression in compressions:
+            encode_ms, payload = time_call(lambda: rawframe.encode_frame(bgra, "BGRA", compression=compression), args.repeat)
+            decode_ms, _ = time_call(lambda: rawframe.frame_to_image(payload), args.repeat)
+            rows[f"frame({compression or 'raw'})"] = (encode_ms, decode_ms, len(payload))
+        report[name] = {
+            label: {
+                "client_encode_ms": round(encode_ms, 2),
+                "server_decode_ms": round(decode_ms, 2),
+                "total_ms": round(encode_ms + decode_ms, 2),
+                "payload_kb": round(size / 1024, 1),
+            }
+            for label, (encode_ms, decode_ms, size) in rows.items()
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Screenshot resize benchmark: the old two-resample path vs the single
+patch-aligned resample.
+
+The old path resized with LANCZOS to roughly MAX_PIXELS, then the Qwen
+preprocessing (``qwen_vl_utils.fetch_image``) resampled again with BICUBIC to
+snap both sides to multiples of 28. The new path computes that final size up
+front and resamples once with the server's configured filter and reducing gap.
+
+Usage:
+    python -m benchmarks.bench_resize --resolutions 1080p 1440p 4k
+"""
+
+import argparse
+import json
+
+from PIL import Image
+
+from benchmarks.common import RESOLUTIONS, synthetic_screenshot, time_call
+from main import MAX_PIXELS, MIN_PIXELS, patch_aligned_size, resize_image
+
+
+def two_pass_resize(image, max_pixels=MAX_PIXELS, min_pixels=MIN_PIXELS):
+    """Previous behaviour: budget resize in the server, grid resize in the preprocessor"""
+    if image.width * image.height > max_pixels:
+        ratio = (max_pixels / (image.width * image.height)) ** 0.5
+        image = image.resize((int(image.width * ratio), int(image.height * ratio)), Image.Resampling.LANCZOS)
+    size = patch_aligned_size(image.width, image.height, max_pixels, min_pixels)
+    if size != image.size:
+        image = image.resize(size, Image.Resampling.BICUBIC)
+    return image
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark two-pass vs single-pass screenshot resizing")
+    parser.add_argument("--resolutions", nargs="+", default=["1080p", "1440p", "4k"], choices=sorted(RESOLUTIONS))
+    parser.add_argument("--repeat", type=int, default=10, help="Resizes per measurement, median reported (default: 10)")
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.resolutions:
+        image = synthetic_screenshot(*RESOLUTIONS[name])
+        old_ms, old = time_call(lambda: two_pass_resize(image), args.repeat)
+        new_ms, new = time_call(lambda: resize_image(image), args.repeat)
+        report[name] = {
+            "two_pass_ms": round(old_ms, 2),
+            "single_pass_ms": round(new_ms, 2),
+            "speedup": round(old_ms / new_ms, 2) if new_ms else None,
+            "two_pass_size": list(old.size),
+            "single_pass_size": list(new.size),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
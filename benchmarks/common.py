@@ -0,0 +1,75 @@
+"""
+Shared helpers for the benchmark scripts.
+"""
+
+import random
+import time
+
+from PIL import Image, ImageDraw
+
+# Screen sizes we commonly serve
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "900p": (1600, 900),
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160),
+}
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def parse_server_timing(value: str) -> dict:
+    """``"decode;dur=3.1, total;dur=52"`` -> {"decode": 3.1, "total": 52.0}"""
+    timings = {}
+    for entry in value.split(","):
+        name, *params = [part.strip() for part in entry.split(";")]
+        for param in params:
+            key, _, dur = param.partition("=")
+            if key == "dur" and name:
+                try:
+                    timings[name] = float(dur)
+                except ValueError:
+                    pass
+    return timings
+
+
+def synthetic_screenshot(width: int, height: int, seed: int = 0) -> Image.Image:
+    """A desktop-like RGB frame: flat panels, buttons, text and a gradient, deterministic per seed"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (242, 242, 242))
+    draw = ImageDraw.Draw(image)
+    # Title bar and sidebar
+    draw.rectangle([0, 0, width, 36], fill=(45, 45, 48))
+    draw.rectangle([0, 36, width // 6, height], fill=(230, 233, 237))
+    # Gradient banner
+    banner_h = height // 8
+    for x in range(width // 6, width):
+        shade = int(80 + 120 * (x - width // 6) / max(1, width - width // 6))
+        draw.line([(x, 48), (x, 48 + banner_h)], fill=(shade, 120, 200))
+    # Buttons and text rows
+    for _ in range(max(20, width * height // 40000)):
+        x = rng.randrange(width // 6, width - 160)
+        y = rng.randrange(60 + banner_h, height - 40)
+        color = rng.choice([(0, 120, 215), (255, 255, 255), (220, 53, 69), (40, 167, 69)])
+        draw.rounded_rectangle([x, y, x + rng.randrange(60, 160), y + 28], radius=4, fill=color, outline=(180, 180, 180))
+        draw.text((x + 8, y + 8), rng.choice(["Submit", "Cancel", "Search", "Settings", "Login", "Help"]), fill=(0, 0, 0))
+    for row in range(60 + banner_h, height, 24):
+        draw.text((12, row), f"Item {row}", fill=(60, 60, 60))
+    return image
+
+
+def time_call(fn, repeat: int = 5):
+    """Median wall time of ``fn()`` in ms, plus the last return value"""
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return percentile(timings, 50), result
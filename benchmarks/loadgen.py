@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+HTTP load generator for the GUI-Actor API.
+
+Closed loop: ``--concurrency`` workers each send a request as soon as their
+previous one returns (measures capacity). Open loop: requests arrive at a fixed
+``--rps`` whether or not earlier ones have finished (measures latency under a
+given load, including queueing). Screenshots are synthetic and encoded before
+the run. Sizes and fast_mode are drawn from configurable mixes, and the first
+``--warmup`` requests are sent but left out of the report.
+
+The JSON report has p50/p90/p99 latency, throughput, error rate and status
+codes, broken down by image size and fast_mode. It also includes the server's
+own time per request (``processing_time_ms`` in the response body), its stage
+timings from ``Server-Timing`` response headers and the ``X-Cache`` outcomes
+(hit, miss, coalesced).
+
+``--spawn-stub`` starts a local server on the stub backend
+(``INFERENCE_BACKEND=stub``), so the whole HTTP pipeline can be load-tested
+without a GPU or model download.
+
+Usage:
+    python -m benchmarks.loadgen --spawn-stub --mode closed --concurrency 8 --requests 400
+    python -m benchmarks.loadgen --url http://gpu-box:8080 --mode open --rps 20 --duration 60 \\
+        --sizes 1080p:3,4k:1 --fast-mode-ratio 0.5 --return coords
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+from benchmarks.common import RESOLUTIONS, parse_server_timing, percentile, synthetic_screenshot
+
+INSTRUCTIONS = [
+    "click the submit button",
+    "find the search box",
+    "click the close button",
+    "open the settings",
+    "click the login button",
+    "click on the help icon",
+]
+
+
+def parse_mix(spec: str):
+    """``"1080p:3,4k:1"`` -> [("1080p", 3.0), ("4k", 1.0)]"""
+    mix = []
+    for item in spec.split(","):
+        name, _, weight = item.strip().partition(":")
+        if name not in RESOLUTIONS:
+            raise SystemExit(f"Unknown size {name!r}; choose from {', '.join(RESOLUTIONS)}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def latency_summary(values) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 2),
+        "p50": round(percentile(values, 50), 2),
+        "p90": round(percentile(values, 90), 2),
+        "p99": round(percentile(values, 99), 2),
+        "max": round(max(values), 2),
+    }
+
+
+def build_payloads(mix, variants: int):
+    """Encoded PNGs per size; ``variants`` different screenshots each so the result cache sees distinct frames"""
+    payloads = {}
+    for name, _ in mix:
+        width, height = RESOLUTIONS[name]
+        payloads[name] = []
+        for seed in range(variants):
+            buffer = io.BytesIO()
+            synthetic_screenshot(width, height, seed=seed).save(buffer, format="PNG", compress_level=1)
+            payloads[name].append(buffer.getvalue())
+    return payloads
+
+
+class LoadGenerator:
+    def __init__(self, args, payloads):
+        self.args = args
+        self.payloads = payloads
+        self.sizes = [name for name, _ in args.sizes]
+        self.weights = [weight for _, weight in args.sizes]
+        self.rng = random.Random(args.seed)
+        self.records = []
+
+    def next_request(self):
+        size = self.rng.choices(self.sizes, self.weights)[0]
+        fast_mode = self.rng.random() < self.args.fast_mode_ratio
+        image = self.rng.choice(self.payloads[size])
+        instruction = self.rng.choice(INSTRUCTIONS)
+        if self.args.unique:
+            instruction += f" #{self.rng.getrandbits(32)}"
+        return size, fast_mode, image, instruction
+
+    async def send(self, client, measured: bool):
+        size, fast_mode, image, instruction = self.next_request()
+        data = {"instruction": instruction, "fast_mode": str(fast_mode).lower(), "return": self.args.return_mode}
+        record = {"size": size, "fast_mode": fast_mode, "measured": measured}
+        start = time.perf_counter()
+        try:
+            response = await client.post(
+                self.args.endpoint, files={"image": ("screenshot.png", image, "image/png")}, data=data
+            )
+            await response.aread()
+            record["status"] = response.status_code
+            if response.status_code == 200:
+                record["server_ms"] = response.json().get("processing_time_ms")
+            record["server_timing"] = parse_server_timing(response.headers.get("server-timing", ""))
+            record["cache"] = response.headers.get("x-cache")
+        except httpx.HTTPError as e:
+            record["status"] = None
+            record["error"] = type(e).__name__
+        record["latency_ms"] = (time.perf_counter() - start) * 1000
+        self.records.append(record)
+
+    async def run_closed(self, client, n_requests, deadline):
+        remaining = [n_requests]
+
+        async def worker():
+            while remaining[0] > 0 and time.perf_counter() < deadline:
+                remaining[0] -= 1
+                await self.send(client, measured=True)
+
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+
+    async def run_open(self, client, n_requests, deadline):
+        interval_rng = random.Random(self.args.seed + 1)
+        tasks = []
+        next_at = time.perf_counter()
+        while len(tasks) < n_requests and next_at < deadline:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # Arrivals do not wait for earlier requests to finish
+            tasks.append(asyncio.create_task(self.send(client, measured=True)))
+            gap = interval_rng.expovariate(self.args.rps) if self.args.poisson else 1.0 / self.args.rps
+            next_at += gap
+        await asyncio.gather(*tasks)
+
+    async def run(self):
+        args = self.args
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=max(args.concurrency, 64))
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+            # Warm-up: same traffic mix, not reported
+            for _ in range(args.warmup):
+                await self.send(client, measured=False)
+            n_requests = args.requests if args.requests else sys.maxsize
+            start = time.perf_counter()
+            deadline = start + args.duration if args.duration else float("inf")
+            if args.mode == "closed":
+                await self.run_closed(client, n_requests, deadline)
+            else:
+                await self.run_open(client, n_requests, deadline)
+            elapsed = time.perf_counter() - start
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> dict:
+        records = [r for r in self.records if r["measured"]]
+        ok = [r for r in records if r["status"] is not None and r["status"] < 400]
+        errors = len(records) - len(ok)
+
+        def group(key):
+            groups = defaultdict(list)
+            for r in ok:
+                groups[str(r[key]).lower()].append(r["latency_ms"])
+            return {name: latency_summary(values) for name, values in sorted(groups.items())}
+
+        stages = defaultdict(list)
+        for r in ok:
+            for name, duration in r["server_timing"].items():
+                stages[name].append(duration)
+        cache = Counter(r["cache"] for r in ok if r.get("cache"))
+        return {
+            "config": {
+                "url": self.args.url,
+                "endpoint": self.args.endpoint,
+                "mode": self.args.mode,
+                "concurrency": self.args.concurrency if self.args.mode == "closed" else None,
+                "rps": self.args.rps if self.args.mode == "open" else None,
+                "arrivals": ("poisson" if self.args.poisson else "uniform") if self.args.mode == "open" else None,
+                "sizes": dict(self.args.sizes),
+                "fast_mode_ratio": self.args.fast_mode_ratio,
+                "return": self.args.return_mode,
+                "warmup_requests": self.args.warmup,
+            },
+            "requests": len(records),
+            "errors": errors,
+            "error_rate": round(errors / len(records), 4) if records else 0.0,
+            "duration_s": round(elapsed, 3),
+            "throughput_rps": round(len(ok) / elapsed, 2) if elapsed > 0 else 0.0,
+            "latency_ms": latency_summary([r["latency_ms"] for r in ok]),
+            "latency_ms_by_size": group("size"),
+            "latency_ms_by_fast_mode": group("fast_mode"),
+            "status_codes": dict(sorted(Counter(str(r["status"] or r.get("error")) for r in records).items())),
+            "server_processing_ms": latency_summary([r["server_ms"] for r in ok if r.get("server_ms") is not None]),
+            "server_timing_ms": {name: latency_summary(values) for name, values in sorted(stages.items())},
+            "cache": {"hits": cache["hit"], "misses": cache["miss"], "coalesced": cache["coalesced"]},
+        }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_stub_server(args):
+    """Start ``uvicorn main:app`` on the stub backend and wait until /readyz is 200"""
+    port = free_port()
+    env = {
+        **os.environ,
+        "INFERENCE_BACKEND": "stub",
+        "STUB_LATENCY_MS": str(args.stub_latency_ms),
+        "STUB_PER_ITEM_MS": str(args.stub_per_item_ms),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL if args.quiet_server else sys.stderr,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        if server.poll() is not None:
+            raise SystemExit(f"Stub server exited with code {server.returncode}")
+        try:
+            if httpx.get(f"{url}/readyz", timeout=1).status_code == 200:
+                return server, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    server.terminate()
+    raise SystemExit("Stub server did not become ready within 30s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the GUI-Actor API and report latency percentiles as JSON")
+    parser.add_argument("--url", default="http://localhost:8080", help="Server base URL (default: http://localhost:8080)")
+    parser.add_argument("--endpoint", default="/process", help="Endpoint taking a multipart image upload (default: /process)")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed", help="Closed loop (concurrency) or open loop (fixed rps)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Closed-loop workers (default: 4)")
+    parser.add_argument("--rps", type=float, default=10.0, help="Open-loop arrival rate (default: 10)")
+    parser.add_argument("--poisson", action="store_true", help="Open loop: exponential inter-arrival times instead of uniform")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests; 0 for no limit (default: 200)")
+    parser.add_argument("--duration", type=float, default=0, help="Stop issuing requests after this many seconds (default: no limit)")
+    parser.add_argument("--warmup", type=int, default=10, help="Requests sent first and excluded from the report (default: 10)")
+    parser.add_argument("--sizes", type=parse_mix, default=parse_mix("1080p"), help="Image size mix, e.g. 1080p:3,4k:1 (default: 1080p)")
+    parser.add_argument("--fast-mode-ratio", type=float, default=0.0, help="Fraction of requests with fast_mode=true (default: 0)")
+    parser.add_argument("--return", dest="return_mode", default="coords", choices=["coords", "coords+topk", "full"],
+                        help="Response shape requested (default: coords)")
+    parser.add_argument("--variants", type=int, default=8, help="Distinct screenshots per size (default: 8)")
+    parser.add_argument("--unique", action="store_true", help="Make every instruction unique so no request hits the result cache")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds (default: 120)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the traffic mix (default: 0)")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--spawn-stub", action="store_true", help="Start a local server on the stub backend and ignore --url")
+    parser.add_argument("--stub-latency-ms", type=float, default=50.0, help="Stub forward-pass latency per batch (default: 50)")
+    parser.add_argument("--stub-per-item-ms", type=float, default=5.0, help="Stub latency per batch item (default: 5)")
+    parser.add_argument("--quiet-server", action="store_true", help="Discard the spawned server's output (default: sent to stderr)")
+    args = parser.parse_args()
+    if not args.requests and not args.duration:
+        parser.error("--requests 0 needs --duration")
+
+    payloads = build_payloads(args.sizes, args.variants)
+    server = None
+    if args.spawn_stub:
+        server, args.url = spawn_stub_server(args)
+    try:
+        report = asyncio.run(LoadGenerator(args, payloads).run())
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
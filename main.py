@@ -1,31 +1,126 @@
 import base64
+import binascii
 import os
 import json
-import torch
-from typing import Optional
+import math
+import re
+from typing import List, Optional
 from PIL import Image, ImageDraw
 import numpy as np
-import matplotlib.pyplot as plt
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 import io
 import time
+import uuid
+import asyncio
+import random
+from contextlib import contextmanager
 from functools import lru_cache
-try:
-    from qwen_vl_utils import process_vision_info
-    from datasets import load_dataset
-    from transformers import AutoProcessor
-    from gui_actor.constants import chat_template
-    from gui_actor.modeling_qwen25vl import Qwen2_5_VLForConditionalGenerationWithPointer
-    from gui_actor.inference import inference
-    GUI_ACTOR_AVAILABLE = True
-except ImportError as e:
-    print(f"Warning: GUI-Actor dependencies not available: {e}")
-    print("Please install GUI-Actor: cd GUI-Actor && pip install -e .")
-    GUI_ACTOR_AVAILABLE = False
-
-MAX_PIXELS = 1600 * 900  # Reduced for faster processing
+from batching import MicroBatcher, QueueFullError
+from caching import ByteLRUCache, SingleFlight, pixel_digest
+from multiscale import candidate_boxes, merge_tile_points, merge_tile_scores, tile_boxes, to_global
+from negotiation import data_url, dumps_json, encode_response, loads_json, negotiate
+import metrics
+from metrics import REGISTRY, histogram_samples, log_request, record_stage, request_elapsed, stage, track_request
+import rawframe
+import shm
+from stub_backend import StubModel
+
+# torch, transformers and GUI-Actor are imported by load_model() in the background
+# (see import_model_dependencies) so uvicorn can serve /livez right away
+torch = None
+GUI_ACTOR_AVAILABLE = None
+
+# Default pixel budget for the model input (start_server.py / docker-compose set MAX_PIXELS);
+# image tokens, and so latency, scale with it
+MAX_PIXELS = int(os.getenv("MAX_PIXELS", str(1600 * 900)))
+MIN_PIXELS = int(os.getenv("MIN_PIXELS", str(56 * 56)))
+# Hard ceiling for per-request max_pixels
+MAX_PIXELS_LIMIT = int(os.getenv("MAX_PIXELS_LIMIT", str(max(MAX_PIXELS, 3840 * 2160))))
+# Model input sides must be multiples of this: Qwen2.5-VL patch size (14) x spatial merge size (2)
+IMAGE_FACTOR = 28
+# Single resample straight to the patch-aligned size; reducing_gap lets Pillow shrink by
+# an integer factor first (Image.reduce) and only filter the remainder
+RESIZE_FILTERS = {
+    "nearest": Image.Resampling.NEAREST,
+    "bilinear": Image.Resampling.BILINEAR,
+    "bicubic": Image.Resampling.BICUBIC,
+    "lanczos": Image.Resampling.LANCZOS,
+}
+RESIZE_FILTER = RESIZE_FILTERS[os.getenv("RESIZE_FILTER", "bilinear")]
+RESIZE_REDUCING_GAP = float(os.getenv("RESIZE_REDUCING_GAP", "2.0")) or None
+# Named pixel budgets a request can pick instead of an explicit max_pixels
+RESOLUTION_TIERS = {
+    "fast": 1280 * 720,
+    "balanced": 1600 * 900,
+    "precise": 2560 * 1440,
+}
+
+# Micro-batching window: concurrent requests are grouped into one forward pass
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+# Requests allowed to wait for the inference worker before new ones get 429
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "64"))
+# Budget for cached vision-tower outputs (on the model device), keyed by screenshot pixel hash
+VISION_CACHE_MB = int(os.getenv("VISION_CACHE_MB", "512"))
+# Exact-match response cache keyed by (pixel hash, instruction, fast_mode)
+RESULT_CACHE_MB = int(os.getenv("RESULT_CACHE_MB", "256"))
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", "300"))
+# Identical requests that arrive while the first is still running share its result instead of queueing again
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "1") == "1"
+# Predictions, and each screenshot once, kept so overlays can be rendered on demand via /results/{result_id}/...
+RESULT_STORE_MB = int(os.getenv("RESULT_STORE_MB", "256"))
+# Never shorter than RESULT_CACHE_TTL_S, so a cached result's result_id does not expire before the result
+RESULT_STORE_TTL_S = max(float(os.getenv("RESULT_STORE_TTL_S", "120")), RESULT_CACHE_TTL_S)
+# Output image codec for overlays/attention maps (server default, overridable per request)
+IMAGE_CODECS = {"png": ("PNG", "image/png"), "webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+IMAGE_CODEC = os.getenv("IMAGE_CODEC", "png")
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))  # WebP/JPEG quality, 1-100
+PNG_COMPRESS_LEVEL = int(os.getenv("PNG_COMPRESS_LEVEL", "1"))  # 0-9; Pillow's default of 6 is several times slower
+WEBP_METHOD = int(os.getenv("WEBP_METHOD", "0"))  # 0 (fastest) - 6; Pillow's default of 4 is ~3x slower
+# Response shapes: coordinates only, plus top-k candidates, or with rendered images
+RETURN_MODES = ("coords", "coords+topk", "full")
+# Grounding strategies: one pass at the pixel budget, a low-resolution pass over the whole
+# frame followed by native-resolution windows around the best candidates (large screenshots),
+# or overlapping tiles run as one batch (ultra-wide / multi-monitor captures)
+GROUNDING_MODES = ("single", "coarse_to_fine", "tiled")
+COARSE_PIXELS = int(os.getenv("COARSE_PIXELS", str(960 * 540)))
+REFINE_WINDOW = int(os.getenv("REFINE_WINDOW", "448"))  # Side of each native-resolution window, a multiple of 28
+REFINE_CANDIDATES = int(os.getenv("REFINE_CANDIDATES", "2"))  # Windows per request; ~256 image tokens each at 448
+TILE_SIZE = tuple(int(v) for v in os.getenv("TILE_SIZE", "1920x1080").lower().split("x"))  # Native tile size, one monitor
+TILE_PIXELS = int(os.getenv("TILE_PIXELS", str(1280 * 720)))  # Model input budget per tile ("fast" tier)
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.1"))  # Minimum overlap between neighbouring tiles, as a fraction
+MAX_TILES = int(os.getenv("MAX_TILES", "8"))  # Tiles grow beyond TILE_SIZE rather than exceed this
+# Synthetic screenshots run through the model before the server reports ready ("WxH,WxH"; empty disables)
+WARMUP_RESOLUTIONS = [
+    tuple(int(v) for v in size.lower().split("x"))
+    for size in os.getenv("WARMUP_RESOLUTIONS", "1280x720,1600x900").split(",") if size.strip()
+]
+WARMUP_ITERATIONS = int(os.getenv("WARMUP_ITERATIONS", "1"))
+# On CPU, time these dtypes x a few torch.set_num_threads values at startup and keep the fastest
+CPU_AUTOTUNE = os.getenv("CPU_AUTOTUNE", "1") == "1"
+CPU_AUTOTUNE_DTYPES = [d.strip() for d in os.getenv("CPU_AUTOTUNE_DTYPES", "bfloat16,float32").split(",") if d.strip()]
+# Largest request body /process-raw reads into memory
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "64"))  # A raw 4K BGRA frame is ~33 MB
+# Memory one /process-json request may hold at once (body, base64 text, decoded bytes, pixels)
+MAX_REQUEST_MEMORY_MB = int(os.getenv("MAX_REQUEST_MEMORY_MB", "256"))
+MAX_JSON_IMAGES = int(os.getenv("MAX_JSON_IMAGES", "8"))
+# Clients allowed to hand frames over through shared memory ("*" for any); /dev/shm is host-local
+SHM_ALLOWED_CLIENTS = [c.strip() for c in os.getenv("SHM_ALLOWED_CLIENTS", "127.0.0.1,::1").split(",") if c.strip()]
+# Inference backend (see BACKENDS): "gui_actor_torch" loads the GUI-Actor checkpoint; "stub" is a
+# deterministic CPU stand-in for profiling and load-testing the serving path without a model
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "gui_actor_torch")
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "50"))  # Simulated forward pass per batch
+STUB_PER_ITEM_MS = float(os.getenv("STUB_PER_ITEM_MS", "5"))  # Plus this per conversation in the batch
+STUB_GRID = os.getenv("STUB_GRID", "")  # Vision grid "WxH" in 28px cells; empty follows the input size
+# Fraction of requests logged as one JSON line with per-stage timings (0 disables; /metrics has the aggregates)
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_SAMPLE_RATE", "0"))
+# Upper bound on instructions per /process-multi request
+MAX_MULTI_INSTRUCTIONS = int(os.getenv("MAX_MULTI_INSTRUCTIONS", "16"))
+
+SYSTEM_PROMPT = "You are a GUI agent. Given a screenshot of the current GUI and a human instruction, your task is to locate the screen element that corresponds to the instruction. You should output a PyAutoGUI action that performs a click on the correct position.To indicate the click location, we will use some special tokens, which is used to refer to a visual patch later. For example, you can output: pyautogui.click(<your_special_token_here>)."
 
 app = FastAPI(
     title="GUI-Actor API",
@@ -40,19 +135,88 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing", "X-Cache", "X-Request-Memory"],
 )
 
-def resize_image(image, resize_to_pixels=MAX_PIXELS):
-    """Optimized image resizing for faster processing"""
-    image_width, image_height = image.size
-    if (resize_to_pixels is not None) and ((image_width * image_height) > resize_to_pixels):
-        resize_ratio = (resize_to_pixels / (image_width * image_height)) ** 0.5
-        image_width_resized, image_height_resized = int(image_width * resize_ratio), int(image_height * resize_ratio)
-        # Use LANCZOS for better quality/speed balance
-        image = image.resize((image_width_resized, image_height_resized), Image.Resampling.LANCZOS)
+REQUESTS_TOTAL = REGISTRY.counter("gui_actor_requests_total", "HTTP requests by route and status code", ("endpoint", "status"))
+REQUEST_SECONDS = REGISTRY.histogram("gui_actor_request_duration_seconds", "Time to response headers by route", ("endpoint",))
+# Client-supplied X-Request-ID values are kept if they look like an id, otherwise replaced
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+def server_timing(stages: dict, total_seconds: float) -> str:
+    """Server-Timing header value: each stage's duration in ms, then the total up to the response headers"""
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    """Count and time every request per route; log a sample of them with their stage timings.
+
+    /process* responses carry X-Request-ID (the client's, if it sent a valid
+    one) and Server-Timing with the stages run so far. For /process-stream
+    that is everything up to the first event.
+    """
+    with track_request() as stages:
+        request_id = request.headers.get("x-request-id")
+        if not request_id or not REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            if request.url.path.startswith("/process"):
+                response.headers["X-Request-ID"] = request_id
+                response.headers["Server-Timing"] = server_timing(stages, request_elapsed())
+            return response
+        finally:
+            elapsed = request_elapsed()
+            route = request.scope.get("route")
+            endpoint = route.path if route is not None else "unmatched"
+            REQUESTS_TOTAL.inc(endpoint=endpoint, status=status)
+            REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+            if REQUEST_LOG_SAMPLE_RATE and random.random() < REQUEST_LOG_SAMPLE_RATE:
+                log_request(
+                    request_id=request_id,
+                    endpoint=endpoint,
+                    status=status,
+                    duration_ms=round(elapsed * 1000, 2),
+                    stages_ms={name: round(seconds * 1000, 2) for name, seconds in stages.items()}
+                )
+
+def patch_aligned_size(width, height, max_pixels=MAX_PIXELS, min_pixels=MIN_PIXELS, factor=IMAGE_FACTOR):
+    """Final model input size: sides are multiples of ``factor`` and the area is within
+    [min_pixels, max_pixels], keeping the aspect ratio (Qwen's smart_resize rule).
+
+    Unlike smart_resize, extreme aspect ratios are not rejected: with the short
+    side held at ``factor``, the long side is cut to stay within ``max_pixels``.
+    """
+    resized_height = max(factor, round(height / factor) * factor)
+    resized_width = max(factor, round(width / factor) * factor)
+    if max_pixels is not None and resized_height * resized_width > max_pixels:
+        beta = math.sqrt((height * width) / max_pixels)
+        resized_height = max(factor, math.floor(height / beta / factor) * factor)
+        resized_width = max(factor, math.floor(width / beta / factor) * factor)
+    elif min_pixels is not None and resized_height * resized_width < min_pixels:
+        beta = math.sqrt(min_pixels / (height * width))
+        resized_height = math.ceil(height * beta / factor) * factor
+        resized_width = math.ceil(width * beta / factor) * factor
+    if max_pixels is not None and resized_height * resized_width > max_pixels:
+        # Only reachable when the short side was clamped up to ``factor``
+        if resized_height > resized_width:
+            resized_height = max(factor, max_pixels // resized_width // factor * factor)
+        else:
+            resized_width = max(factor, max_pixels // resized_height // factor * factor)
+    return resized_width, resized_height
+
+def resize_image(image, resize_to_pixels=MAX_PIXELS, min_pixels=MIN_PIXELS):
+    """Resample once, straight to the patch-aligned size the model sees, so the processor need not resize again"""
+    size = patch_aligned_size(image.width, image.height, resize_to_pixels, min_pixels)
+    if size != image.size:
+        with stage("resize"):
+            image = image.resize(size, RESIZE_FILTER, reducing_gap=RESIZE_REDUCING_GAP)
     return image
 
-@torch.inference_mode()
 def draw_point(image: Image.Image, point: list, radius=8, color=(255, 0, 0, 128)):
     overlay = Image.new('RGBA', image.size, (255, 255, 255, 0))
     overlay_draw = ImageDraw.Draw(overlay)
@@ -67,114 +231,271 @@ def draw_point(image: Image.Image, point: list, radius=8, color=(255, 0, 0, 128)
     combined = combined.convert('RGB')
     return combined
 
-# Cache colormap for faster attention map generation
+# matplotlib's "jet" colormap as (x, value) control points per channel
+JET_SEGMENTS = (
+    ((0.0, 0.0), (0.35, 0.0), (0.66, 1.0), (0.89, 1.0), (1.0, 0.5)),  # red
+    ((0.0, 0.0), (0.125, 0.0), (0.375, 1.0), (0.64, 1.0), (0.91, 0.0), (1.0, 0.0)),  # green
+    ((0.0, 0.5), (0.11, 1.0), (0.34, 1.0), (0.65, 0.0), (1.0, 0.0)),  # blue
+)
+
 @lru_cache(maxsize=1)
-def get_colormap():
-    return plt.get_cmap('jet')
+def get_colormap_lut():
+    """256 x 3 uint8 lookup table mapping a uint8 score to its jet color"""
+    x = np.linspace(0.0, 1.0, 256)
+    jet = np.stack([np.interp(x, *zip(*segments)) for segments in JET_SEGMENTS], axis=1)
+    # Same uint8 -> colormap bin mapping as matplotlib's cmap(k / 255)
+    bins = np.minimum(np.arange(256) * 256 // 255, 255)
+    return (jet[bins] * 255).astype(np.uint8)
 
-@torch.inference_mode()
 def get_attn_map(image, attn_scores, n_width, n_height):
-    """Optimized attention map generation"""
+    """Blend the jet-colored attention grid over the image.
+
+    Colors are looked up on the small n_height x n_width grid and upscaled once
+    in uint8, so memory stays at a few bytes per output pixel.
+    """
     w, h = image.size
-    scores = np.array(attn_scores[0]).reshape(n_height, n_width)
+    if hasattr(attn_scores, "detach"):
+        attn_scores = attn_scores.detach().float().cpu().numpy()
+    scores = np.asarray(attn_scores, dtype=np.float32).reshape(-1, n_height * n_width)[0].reshape(n_height, n_width)
 
-    # Optimize normalization
     scores_min, scores_max = scores.min(), scores.max()
     if scores_max > scores_min:
-        scores_norm = (scores - scores_min) / (scores_max - scores_min)
+        levels = ((scores - scores_min) * (255.0 / (scores_max - scores_min))).astype(np.uint8)
     else:
-        scores_norm = scores * 0  # All zeros if no variation
-    
-    # Resize score map to match image size
-    score_map = Image.fromarray((scores_norm * 255).astype(np.uint8)).resize((w, h), resample=Image.Resampling.NEAREST)
-    
-    # Apply colormap (cached)
-    colormap = get_colormap()
-    colored_score_map = colormap(np.array(score_map) / 255.0)  # returns RGBA
-    colored_score_map = (colored_score_map[:, :, :3] * 255).astype(np.uint8)
-    colored_overlay = Image.fromarray(colored_score_map)
+        levels = np.zeros(scores.shape, dtype=np.uint8)  # All zeros if no variation
+
+    colored_grid = Image.fromarray(get_colormap_lut()[levels])
+    colored_overlay = colored_grid.resize((w, h), resample=Image.Resampling.NEAREST)
 
     # Blend with original image
-    blended = Image.blend(image, colored_overlay, alpha=0.3)
-    return blended
+    return Image.blend(image, colored_overlay, alpha=0.3)
 
 # Global model variables
 model = None
 tokenizer = None
 data_processor = None
+batcher = None
+vision_cache = ByteLRUCache(VISION_CACHE_MB * 1024 * 1024)
+result_cache = ByteLRUCache(RESULT_CACHE_MB * 1024 * 1024, ttl_seconds=RESULT_CACHE_TTL_S)
+result_store = ByteLRUCache(RESULT_STORE_MB * 1024 * 1024, ttl_seconds=RESULT_STORE_TTL_S)
+in_flight = SingleFlight()
 
-def load_model():
-    """Load the model globally with optimizations"""
+# Startup progress, reported by /readyz
+STARTUP_PHASES = ("imports", "processor", "weights", "warmup")
+startup_state = {
+    "status": "starting",  # starting -> loading -> ready | failed
+    "started_at": time.time(),
+    "phases": {name: {"status": "pending", "duration_ms": None} for name in STARTUP_PHASES},
+    "error": None
+}
+
+@contextmanager
+def startup_phase(name: str):
+    """Record the status and duration of one startup phase"""
+    phase = startup_state["phases"][name]
+    phase["status"] = "running"
+    phase_start = time.perf_counter()
+    try:
+        yield phase
+    except Exception:
+        phase["status"] = "failed"
+        raise
+    else:
+        phase["status"] = "done"
+    finally:
+        phase["duration_ms"] = (time.perf_counter() - phase_start) * 1000
+
+def import_model_dependencies():
+    """Import torch, transformers and GUI-Actor; sets GUI_ACTOR_AVAILABLE"""
+    global torch, GUI_ACTOR_AVAILABLE, AutoProcessor, Qwen2_5_VLForConditionalGenerationWithPointer
+    global batch_inference, shared_prefix_inference
+    import torch
+    try:
+        from transformers import AutoProcessor
+        from gui_actor.modeling_qwen25vl import Qwen2_5_VLForConditionalGenerationWithPointer
+        from batch_inference import batch_inference, shared_prefix_inference
+        GUI_ACTOR_AVAILABLE = True
+    except ImportError as e:
+        print(f"Warning: GUI-Actor dependencies not available: {e}")
+        print("Please install GUI-Actor: cd GUI-Actor && pip install -e .")
+        GUI_ACTOR_AVAILABLE = False
+
+# Execution settings chosen at startup, reported by /health
+execution_settings = {}
+
+def warmup_image(width: int, height: int) -> Image.Image:
+    """Synthetic screenshot: light background with a title bar and a grid of buttons"""
+    image = Image.new('RGB', (width, height), (240, 240, 240))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, width, 32], fill=(45, 45, 48))
+    for x in range(40, width - 120, 200):
+        for y in range(80, height - 40, 120):
+            draw.rectangle([x, y, x + 120, y + 32], fill=(0, 120, 215))
+            draw.text((x + 10, y + 10), "Button", fill=(255, 255, 255))
+    return image
+
+def run_warmup_request(run_batch, width: int, height: int):
+    """One synthetic request through the same resize and inference path as real traffic"""
+    image, image_key = prepare_image(warmup_image(width, height))
+    run_batch([build_conversation(image, "click the first button", image_key)])
+
+def autotune_cpu():
+    """Time a small synthetic request per dtype and thread count, keep the fastest setting"""
+    cpu_count = os.cpu_count() or 1
+    thread_options = sorted({cpu_count, max(1, cpu_count // 2), max(1, cpu_count // 4)}, reverse=True)
+    width, height = min(WARMUP_RESOLUTIONS, key=lambda size: size[0] * size[1], default=(640, 360))
+
+    trials = []
+    for dtype_name in CPU_AUTOTUNE_DTYPES:
+        model.to(getattr(torch, dtype_name))
+        for threads in thread_options:
+            torch.set_num_threads(threads)
+            # First run at a new setting pays for its own initialization; time the second
+            timings = []
+            for _ in range(2):
+                vision_cache.clear()
+                trial_start = time.perf_counter()
+                run_warmup_request(run_inference_batch, width, height)
+                timings.append((time.perf_counter() - trial_start) * 1000)
+            trials.append({"dtype": dtype_name, "num_threads": threads, "latency_ms": timings[-1]})
+            print(f"⏱️  Autotune {dtype_name} x {threads} threads: {timings[-1]:.1f}ms")
+
+    best = min(trials, key=lambda trial: trial["latency_ms"])
+    model.to(getattr(torch, best["dtype"]))
+    torch.set_num_threads(best["num_threads"])
+    vision_cache.clear()
+    return {"resolution": f"{width}x{height}", "best": best, "trials": trials}
+
+def warm_up(phase: dict, run_batch):
+    """Run synthetic screenshots at each warm-up resolution through the backend"""
+    for width, height in WARMUP_RESOLUTIONS:
+        for _ in range(WARMUP_ITERATIONS):
+            run_warmup_request(run_batch, width, height)
+    # Don't let synthetic frames occupy the feature cache
+    vision_cache.clear()
+    phase["resolutions"] = [f"{width}x{height}" for width, height in WARMUP_RESOLUTIONS]
+
+def load_gui_actor_torch():
+    """GUI-Actor on PyTorch: import, load processor and weights, autotune (CPU) and warm up"""
     global model, tokenizer, data_processor
-    
+
+    with startup_phase("imports"):
+        import_model_dependencies()
     if not GUI_ACTOR_AVAILABLE:
-        print("Error: GUI-Actor dependencies not available. Please install them first.")
-        return
-    
-    try:
+        raise RuntimeError("GUI-Actor dependencies not available. Please install them first.")
+
+    if torch.cuda.is_available():
+        model_name_or_path = "microsoft/GUI-Actor-7B-Qwen2.5-VL"
+        model_kwargs = {"device_map": "cuda:0", "attn_implementation": "flash_attention_2"}
+    else:
+        model_name_or_path = "microsoft/GUI-Actor-3B-Qwen2.5-VL"
+        model_kwargs = {"device_map": "cpu"}
+    execution_settings.update(model=model_name_or_path, device=model_kwargs["device_map"])
+
+    with startup_phase("processor"):
+        data_processor = AutoProcessor.from_pretrained(model_name_or_path, use_fast=True)
+        tokenizer = data_processor.tokenizer
+
+    with startup_phase("weights"):
+        loaded = Qwen2_5_VLForConditionalGenerationWithPointer.from_pretrained(
+            model_name_or_path,
+            torch_dtype=torch.bfloat16,
+            **model_kwargs
+        ).eval()
+        
         if torch.cuda.is_available():
-            model_name_or_path = "microsoft/GUI-Actor-7B-Qwen2.5-VL"
-            data_processor = AutoProcessor.from_pretrained(model_name_or_path, use_fast=True)
-            tokenizer = data_processor.tokenizer
-            model = Qwen2_5_VLForConditionalGenerationWithPointer.from_pretrained(
-                model_name_or_path,
-                torch_dtype=torch.bfloat16,
-                device_map="cuda:0",
-                attn_implementation="flash_attention_2"
-            ).eval()
-            
             # Optimize for inference
             torch.backends.cudnn.benchmark = True
             torch.backends.cuda.matmul.allow_tf32 = True
             torch.backends.cudnn.allow_tf32 = True
-            
         else:
-            model_name_or_path = "microsoft/GUI-Actor-3B-Qwen2.5-VL"
-            data_processor = AutoProcessor.from_pretrained(model_name_or_path, use_fast=True)
-            tokenizer = data_processor.tokenizer
-            model = Qwen2_5_VLForConditionalGenerationWithPointer.from_pretrained(
-                model_name_or_path,
-                torch_dtype=torch.bfloat16,
-                device_map="cpu"
-            ).eval()
-            
             # Optimize for CPU inference
             torch.set_num_threads(os.cpu_count())
+        model = loaded
+
+    with startup_phase("warmup") as phase:
+        if not torch.cuda.is_available() and CPU_AUTOTUNE and CPU_AUTOTUNE_DTYPES:
+            execution_settings["autotune"] = autotune_cpu()
+        warm_up(phase, run_inference_batch)
+        execution_settings["dtype"] = str(next(model.parameters()).dtype).replace("torch.", "")
+        execution_settings["num_threads"] = torch.get_num_threads()
+    return run_inference_batch
+
+def load_stub():
+    """Deterministic stub model: no imports, processor or weights to load"""
+    global model
+    grid = tuple(int(v) for v in STUB_GRID.lower().split("x")) if STUB_GRID else None
+    model = StubModel(latency_ms=STUB_LATENCY_MS, per_item_ms=STUB_PER_ITEM_MS, grid=grid)
+    execution_settings.update(latency_ms=STUB_LATENCY_MS, per_item_ms=STUB_PER_ITEM_MS, grid=STUB_GRID or "input")
+    with startup_phase("warmup") as phase:
+        warm_up(phase, model.run_batch)
+    return model.run_batch
+
+# Backend name -> loader; a loader sets up the model and returns the batch callable for the scheduler
+BACKENDS = {
+    "gui_actor_torch": load_gui_actor_torch,
+    "stub": load_stub,
+}
+
+def load_model():
+    """Load the configured backend, recording each startup phase, then start the scheduler"""
+    startup_state["status"] = "loading"
+    try:
+        if INFERENCE_BACKEND not in BACKENDS:
+            raise RuntimeError(f"Unknown INFERENCE_BACKEND {INFERENCE_BACKEND!r}; choose one of {', '.join(BACKENDS)}")
+        execution_settings["backend"] = INFERENCE_BACKEND
+        run_batch = BACKENDS[INFERENCE_BACKEND]()
+        for phase in startup_state["phases"].values():
+            if phase["status"] == "pending":
+                phase["status"] = "skipped"
+
+        start_batcher(run_batch)
+        startup_state["status"] = "ready"
             
     except Exception as e:
+        startup_state["status"] = "failed"
+        startup_state["error"] = str(e)
         print(f"Error loading model: {e}")
         print("Please ensure you have the correct model files and dependencies installed.")
+    finally:
+        startup_state["duration_ms"] = (time.time() - startup_state["started_at"]) * 1000
 
-def image_to_base64(image: Image.Image) -> str:
-    """Convert PIL Image to base64 string"""
+def resolve_codec(codec: Optional[str] = None, quality: Optional[int] = None, compress_level: Optional[int] = None) -> dict:
+    """Merge per-request codec options with the server defaults"""
+    codec = (codec or IMAGE_CODEC).lower()
+    if codec == "jpg":
+        codec = "jpeg"
+    if codec not in IMAGE_CODECS:
+        raise HTTPException(status_code=400, detail=f"image_codec must be one of {', '.join(IMAGE_CODECS)}")
+    quality = IMAGE_QUALITY if quality is None else quality
+    compress_level = PNG_COMPRESS_LEVEL if compress_level is None else compress_level
+    if not 1 <= quality <= 100 or not 0 <= compress_level <= 9:
+        raise HTTPException(status_code=400, detail="image_quality must be 1-100 and png_compress_level 0-9")
+    return {"codec": codec, "quality": quality, "compress_level": compress_level}
+
+def image_to_bytes(image: Image.Image, codec: Optional[dict] = None):
+    """Encode PIL Image with the given codec options; returns (bytes, mime type)"""
+    codec = codec or resolve_codec()
+    image_format, mime_type = IMAGE_CODECS[codec["codec"]]
     buffer = io.BytesIO()
-    image.save(buffer, format='PNG')
-    img_str = base64.b64encode(buffer.getvalue()).decode()
-    return f"data:image/png;base64,{img_str}"
-
-@torch.inference_mode()
-def process(image: Image.Image, instruction: str, fast_mode: bool = False):
-    """Process the image and instruction to get predictions with timing"""
-    if model is None:
-        raise HTTPException(status_code=503, detail="Model not loaded. Please check installation.")
-    
-    start_time = time.time()
-    
-    # resize image
-    w, h = image.size
-    if w * h > MAX_PIXELS:
-        image = resize_image(image)
-    
-    resize_time = time.time()
-    print(f"⏱️  Resize time: {(resize_time - start_time)*1000:.1f}ms")
+    with stage("encode"):
+        if image_format == "PNG":
+            image.save(buffer, format=image_format, compress_level=codec["compress_level"])
+        elif image_format == "WEBP":
+            image.save(buffer, format=image_format, quality=codec["quality"], method=WEBP_METHOD)
+        else:
+            image.save(buffer, format=image_format, quality=codec["quality"])
+    return buffer.getvalue(), mime_type
 
-    conversation = [
+def build_conversation(image: Image.Image, instruction: str, image_key: Optional[str] = None):
+    """Build the grounding conversation for one screenshot and instruction"""
+    return [
         {
             "role": "system",
             "content": [
                 {
                     "type": "text",
-                    "text": "You are a GUI agent. Given a screenshot of the current GUI and a human instruction, your task is to locate the screen element that corresponds to the instruction. You should output a PyAutoGUI action that performs a click on the correct position.To indicate the click location, we will use some special tokens, which is used to refer to a visual patch later. For example, you can output: pyautogui.click(<your_special_token_here>).",
+                    "text": SYSTEM_PROMPT,
                 }
             ]
         },
@@ -184,6 +505,7 @@ def process(image: Image.Image, instruction: str, fast_mode: bool = False):
                 {
                     "type": "image",
                     "image": image, # PIL.Image.Image or str to path
+                    "image_key": image_key, # pixel hash for the vision feature cache
                     # "image_url": "https://xxxxx.png" or "https://xxxxx.jpg" or "file://xxxxx.png" or "data:image/png;base64,xxxxxxxx", will be split by "base64,"
                 },
                 {
@@ -194,52 +516,560 @@ def process(image: Image.Image, instruction: str, fast_mode: bool = False):
         },
     ]
 
+def run_inference_batch(items):
+    """Batch callable for the scheduler.
+
+    Single conversations share one padded forward pass; ``{"shared_prefix": [...]}``
+    jobs (one screenshot, several instructions) each run on a shared prefix.
+    """
+    results = [None] * len(items)
+    singles = [i for i, item in enumerate(items) if isinstance(item, list)]
+    if singles:
+        preds = batch_inference([items[i] for i in singles], model, tokenizer, data_processor, topk=3, vision_cache=vision_cache)
+        for i, pred in zip(singles, preds):
+            results[i] = pred
+    for i, item in enumerate(items):
+        if isinstance(item, dict):
+            results[i] = shared_prefix_inference(item["shared_prefix"], model, tokenizer, data_processor, topk=3, vision_cache=vision_cache)
+    return results
+
+def start_batcher(run_batch):
+    """Start the micro-batching scheduler once the backend is loaded"""
+    global batcher
+    if batcher is None:
+        batcher = MicroBatcher(
+            run_batch,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            max_queue_size=INFERENCE_QUEUE_SIZE
+        ).start()
+
+def require_ready():
+    """Reject requests with 503 until the model is loaded and warmed up"""
+    if startup_state["status"] != "ready" or batcher is None:
+        loading = startup_state["status"] in ("starting", "loading")
+        raise HTTPException(
+            status_code=503,
+            detail="Model is still loading, please retry later" if loading else "Model not loaded. Please check installation.",
+            headers={"Retry-After": "10"} if loading else None
+        )
+
+async def submit_inference(job):
+    """Queue a job on the inference worker and await its prediction without blocking the event loop"""
+    try:
+        future = batcher.submit(job)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Inference queue is full, please retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return await asyncio.wrap_future(future)
+
+def decode_image(image_data: bytes) -> Image.Image:
+    """Decode uploaded image bytes to RGB"""
+    with stage("decode"):
+        return Image.open(io.BytesIO(image_data)).convert('RGB')
+
+def decode_base64_image(image_base64: str) -> Image.Image:
+    """Decode a base64 (optionally data URL) image string to RGB"""
+    if image_base64.startswith('data:image'):
+        # Remove data URL prefix
+        image_base64 = image_base64.split(',')[1]
+    return decode_image(base64.b64decode(image_base64))
+
+def decode_image_at(image_data, resolution: Optional[dict] = None):
+    """Decode image bytes once, straight to the model input size for ``resolution``.
+
+    JPEGs are decoded at a reduced DCT scale (``draft``) no smaller than the
+    target, so a 4K JPEG is never materialized at full size. Without
+    ``resolution`` the image is decoded at native size. Returns (RGB image, source size).
+    """
+    with stage("decode"):
+        image = Image.open(io.BytesIO(image_data))
+        source_size = image.size
+        if resolution is None:
+            return image.convert("RGB"), source_size
+        target = patch_aligned_size(image.width, image.height, resolution["max_pixels"], resolution["min_pixels"])
+        if image.format == "JPEG":
+            image.draft("RGB", target)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+    if image.size != target:
+        with stage("resize"):
+            image = image.resize(target, RESIZE_FILTER, reducing_gap=RESIZE_REDUCING_GAP)
+    return image, source_size
+
+async def read_body(request: Request, limit: int = MAX_UPLOAD_MB * 1024 * 1024) -> bytearray:
+    """Stream the request body into memory (never spooled to disk); 413 past ``limit`` bytes"""
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        try:
+            content_length = int(content_length)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Content-Length")
+        if content_length > limit:
+            raise HTTPException(status_code=413, detail=f"Body larger than {limit} bytes")
+    body = bytearray()
+    with stage("upload_read"):
+        async for chunk in request.stream():
+            body += chunk
+            if len(body) > limit:
+                raise HTTPException(status_code=413, detail=f"Body larger than {limit} bytes")
+    if not body:
+        raise HTTPException(status_code=400, detail="Empty request body")
+    return body
+
+async def read_upload(image: UploadFile) -> bytes:
+    """Bytes of a multipart upload.
+
+    FastAPI receives and parses the form before the endpoint runs, so
+    upload_read is measured from the start of the request.
+    """
+    data = await image.read()
+    record_stage("upload_read", request_elapsed())
+    return data
+
+def decode_json_images(images: List[str], resolution: Optional[dict], held_bytes: int, limit: int):
+    """Decode base64 images from a parsed JSON body, accounting the memory held on the way.
+
+    Base64 text goes straight to bytes (``a2b_base64``, no intermediate copy
+    unless a data URL prefix has to be cut), then each image is decoded once
+    to the model input size (``decode_image_at``). ``held_bytes`` counts what
+    the caller already holds; past ``limit`` the request gets 413.
+    Returns ([(image, source size)], peak bytes).
+    """
+    held = held_bytes
+    peak = held
+    decoded = []
+    for text in images:
+        if text.startswith("data:"):
+            _, comma, text = text.partition(",")
+            if not comma:
+                raise HTTPException(status_code=400, detail="Invalid data URL: no ',' before the base64 data")
+        try:
+            data = binascii.a2b_base64(text)
+        except ValueError as e:  # binascii.Error, or non-ASCII text
+            raise HTTPException(status_code=400, detail=f"Invalid base64: {str(e)}")
+        try:
+            width, height = Image.open(io.BytesIO(data)).size
+            # Encoded bytes plus the decoded RGB frame exist together while decoding
+            peak = max(peak, held + len(data) + width * height * 3)
+            if peak > limit:
+                raise HTTPException(status_code=413, detail=f"Request needs more than {limit} bytes of memory")
+            image, source_size = decode_image_at(data, resolution)
+        except (OSError, Image.DecompressionBombError) as e:  # includes UnidentifiedImageError and truncated data
+            raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+        held += image.width * image.height * 3
+        decoded.append((image, source_size))
+    return decoded, peak
+
+def resolve_resolution(tier: Optional[str] = None, max_pixels: Optional[int] = None, min_pixels: Optional[int] = None) -> dict:
+    """Pixel budget for a request: explicit max_pixels, else the named tier, else the MAX_PIXELS default"""
+    if tier is not None and tier not in RESOLUTION_TIERS:
+        raise HTTPException(status_code=400, detail=f"tier must be one of {', '.join(RESOLUTION_TIERS)}")
+    if max_pixels is None:
+        max_pixels = RESOLUTION_TIERS[tier] if tier is not None else MAX_PIXELS
+    min_pixels = MIN_PIXELS if min_pixels is None else min_pixels
+    if not 0 < min_pixels <= max_pixels <= MAX_PIXELS_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Need 0 < min_pixels <= max_pixels <= {MAX_PIXELS_LIMIT}")
+    return {"max_pixels": max_pixels, "min_pixels": min_pixels}
+
+def prepare_image(image: Image.Image, digest: Optional[str] = None, resolution: Optional[dict] = None):
+    """Resize into the pixel budget and derive the vision feature cache key.
+
+    Resizing is deterministic, so the hash of the decoded pixels plus the
+    resized size identifies the resized pixels without hashing them again.
+    """
+    if digest is None:
+        digest = pixel_digest(image)
+    resolution = resolution or resolve_resolution()
+    image = resize_image(image, resolution["max_pixels"], resolution["min_pixels"])
+    return image, resized_key(digest, image)
+
+def resized_key(digest: str, image: Image.Image) -> str:
+    """Key of a deterministic resize of the image whose pixel digest is ``digest``"""
+    return f"{digest}@{image.width}x{image.height}"
+
+async def ground_single(image: Image.Image, instruction: str, digest: str, resolution: dict):
+    """One pass at the request's pixel budget; returns (model input image, pred, resolution report)"""
+    image, image_key = await run_in_threadpool(prepare_image, image, digest, resolution)
+    with stage("inference"):
+        pred = await submit_inference(build_conversation(image, instruction, image_key))
+    return image, pred, resolution_report(image, pred)
+
+async def ground_coarse_to_fine(image: Image.Image, instruction: str, digest: str, resolution: dict):
+    """Find candidates on a low-resolution view, then ground again inside native-resolution windows around them.
+
+    Window points are mapped back to the full frame and ranked by region score.
+    The overlay and attention map are drawn on the coarse view, which covers the
+    whole frame.
+    """
+    coarse_resolution = {**resolution, "max_pixels": min(resolution["max_pixels"], COARSE_PIXELS)}
+    coarse_resolution["min_pixels"] = min(coarse_resolution["min_pixels"], coarse_resolution["max_pixels"])
+    coarse_image, coarse_pred, report = await ground_single(image, instruction, digest, coarse_resolution)
+    if image.width * image.height <= coarse_resolution["max_pixels"]:
+        # Already at native resolution, nothing to refine
+        return coarse_image, coarse_pred, report
+
+    boxes = candidate_boxes(coarse_pred["topk_points"], image.size, (REFINE_WINDOW, REFINE_WINDOW), REFINE_CANDIDATES)
+    window_resolution = {"max_pixels": REFINE_WINDOW ** 2, "min_pixels": min(resolution["min_pixels"], REFINE_WINDOW ** 2)}
+    windows = await run_in_threadpool(
+        lambda: [prepare_image(image.crop(box), None, window_resolution) for box in boxes]
+    )
+    # Submitted together so the scheduler runs the windows as one batch
+    with stage("inference"):
+        preds = await asyncio.gather(
+            *(submit_inference(build_conversation(window, instruction, key)) for window, key in windows)
+        )
+
+    candidates = []
+    for box, pred in zip(boxes, preds):
+        values = pred.get("topk_values") or [0.0] * len(pred["topk_points"])
+        candidates.extend((float(value), to_global(point, box, image.size)) for point, value in zip(pred["topk_points"], values))
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+    topk = len(coarse_pred["topk_points"])
+    pred = {
+        **coarse_pred,
+        "topk_points": [point for _, point in candidates[:topk]],
+        "topk_values": [value for value, _ in candidates[:topk]]
+    }
+    report["image_tokens"] += sum(p["n_width"] * p["n_height"] for p in preds)
+    report["refine_windows"] = [list(box) for box in boxes]
+    return coarse_image, pred, report
+
+async def ground_tiled(image: Image.Image, instruction: str, digest: str, resolution: dict):
+    """Ground on overlapping tiles submitted as one batch, then merge them into one global prediction.
+
+    Each tile stays within TILE_PIXELS, so wide captures keep their detail and
+    use the batch dimension instead of one long sequence. Tile attention grids
+    are merged into a global map, which ranks the tiles' points; the overlay is
+    drawn on the whole frame resized to the request's pixel budget.
+    """
+    boxes = tile_boxes(image.size, TILE_SIZE, TILE_OVERLAP, MAX_TILES)
+    if len(boxes) == 1:
+        return await ground_single(image, instruction, digest, resolution)
+
+    tile_resolution = {"max_pixels": min(resolution["max_pixels"], TILE_PIXELS)}
+    tile_resolution["min_pixels"] = min(resolution["min_pixels"], tile_resolution["max_pixels"])
+
+    def prepare_tiles():
+        # Tile keys derive from the frame hash and the box, so tiles are not hashed again
+        tiles = [prepare_image(image.crop(box), f"{digest}:{','.join(map(str, box))}", tile_resolution) for box in boxes]
+        return tiles, resize_image(image, resolution["max_pixels"], resolution["min_pixels"])
+
+    tiles, frame = await run_in_threadpool(prepare_tiles)
+    # Submitted together so the scheduler runs the tiles as one batch
+    with stage("inference"):
+        preds = await asyncio.gather(
+            *(submit_inference(build_conversation(tile, instruction, key)) for tile, key in tiles)
+        )
+
+    merged = merge_tile_scores(boxes, preds, image.size)
+    points, values = merge_tile_points(boxes, preds, merged, image.size, len(preds[0]["topk_points"]))
+    pred = {
+        "n_width": merged.shape[1],
+        "n_height": merged.shape[0],
+        "attn_scores": merged.reshape(1, -1),
+        "topk_points": points,
+        "topk_values": values
+    }
+    report = {
+        "effective_resolution": {"width": tiles[0][0].width, "height": tiles[0][0].height},
+        "image_tokens": sum(p["n_width"] * p["n_height"] for p in preds),
+        "tiles": [list(box) for box in boxes]
+    }
+    return frame, pred, report
+
+def store_result(image: Image.Image, pred: dict, image_key: str) -> str:
+    """Keep the prediction so overlays can be rendered later; returns the result id.
+
+    The screenshot is stored once per ``image_key`` (see ``resized_key``) and
+    shared by every result on it, so it is only counted once in the budget.
+    """
+    result_store.put(("image", image_key), image)
+    result_id = uuid.uuid4().hex
+    result_store.put(result_id, {"image_key": image_key, "pred": pred})
+    return result_id
+
+def render_overlay(image: Image.Image, pred: dict) -> Image.Image:
+    """Screenshot with the predicted click point drawn on it"""
+    px, py = pred["topk_points"][0]
+    w, h = image.size
+    with stage("draw"):
+        return draw_point(image, (px * w, py * h))
+
+def render_attention_map(image: Image.Image, pred: dict) -> Image.Image:
+    """Screenshot blended with the pointer attention scores"""
+    with stage("attention_map"):
+        return get_attn_map(image, pred["attn_scores"], pred["n_width"], pred["n_height"])
+
+def render_result(
+    image: Image.Image,
+    pred: dict,
+    fast_mode: bool = False,
+    return_mode: str = "full",
+    codec: Optional[dict] = None
+):
+    """Build the response body; images are only drawn and encoded for ``return_mode="full"``.
+
+    Images are kept as ``(bytes, mime_type)``; ``negotiation.encode_response``
+    turns them into data URLs, msgpack binaries or multipart parts.
+    """
+    px, py = pred["topk_points"][0]
+    result = {
+        "coordinates": f"({px:.4f}, {py:.4f})",
+        "raw_coordinates": {"x": px, "y": py},
+    }
+
+    if return_mode == "coords+topk":
+        result["topk_points"] = [{"x": x, "y": y} for x, y in pred["topk_points"]]
+        result["topk_values"] = pred.get("topk_values")
+    elif return_mode == "full":
+        result["image_with_point"] = image_to_bytes(render_overlay(image, pred), codec)
+        # Skip attention map in fast mode
+        if not fast_mode:
+            result["attention_map"] = image_to_bytes(render_attention_map(image, pred), codec)
+    return result
+
+def resolution_report(image: Image.Image, pred: dict) -> dict:
+    """Resolution the model actually saw and the number of image tokens it cost"""
+    return {
+        "effective_resolution": {"width": image.width, "height": image.height},
+        "image_tokens": pred["n_width"] * pred["n_height"]
+    }
+
+def check_return_mode(return_mode: str) -> str:
+    if return_mode not in RETURN_MODES:
+        raise HTTPException(status_code=400, detail=f"return must be one of {', '.join(RETURN_MODES)}")
+    return return_mode
+
+def check_mode(mode: str) -> str:
+    if mode not in GROUNDING_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(GROUNDING_MODES)}")
+    return mode
+
+async def ground(image: Image.Image, instruction: str, digest: str, resolution: dict, mode: str = "single"):
+    """Run the grounding strategy for ``mode``; returns (image to render on, pred, resolution report)"""
     try:
-        inference_start = time.time()
-        pred = inference(conversation, model, tokenizer, data_processor, use_placeholder=True, topk=3)
-        inference_time = time.time()
-        print(f"⏱️  Inference time: {(inference_time - inference_start)*1000:.1f}ms")
+        # Resizing runs in a worker thread; inference is queued on the scheduler,
+        # which batches it with concurrent requests
+        if mode == "coarse_to_fine":
+            return await ground_coarse_to_fine(image, instruction, digest, resolution)
+        if mode == "tiled":
+            return await ground_tiled(image, instruction, digest, resolution)
+        return await ground_single(image, instruction, digest, resolution)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during inference: {str(e)}")
 
-    px, py = pred["topk_points"][0]
-    output_coord = f"({px:.4f}, {py:.4f})"
+async def process(
+    image: Image.Image,
+    instruction: str,
+    fast_mode: bool = False,
+    return_mode: str = "full",
+    codec: Optional[dict] = None,
+    resolution: Optional[dict] = None,
+    mode: str = "single",
+    source_size: Optional[tuple] = None,
+    headers: Optional[dict] = None
+):
+    """Process the image and instruction to get predictions with timing
+
+    ``return_mode`` is one of ``RETURN_MODES``; only ``"full"`` renders images
+    inline (encoded with ``codec``, see ``resolve_codec``), the others can fetch
+    them later through the returned ``result_id``. ``resolution`` is the pixel
+    budget from ``resolve_resolution``. ``mode`` is one of ``GROUNDING_MODES``.
+    ``source_size`` is the uploaded image's size when ``image`` was already
+    decoded at a reduced size (``decode_image_at``).
+    ``headers``, if given, is filled with response headers (``X-Cache``:
+    hit, miss, or coalesced when an identical in-flight request was joined).
+    """
+    require_ready()
     
-    # Optimize image processing
-    post_start = time.time()
-    img_with_point = draw_point(image, (px * w, py * h))
+    start_time = time.time()
+    w, h = source_size or image.size
+
+    # Identical (pixels, instruction, options) requests are answered from the result cache,
+    # or join the identical request already in flight (SINGLE_FLIGHT)
+    digest = await run_in_threadpool(pixel_digest, image)
+    codec = codec or resolve_codec()
+    resolution = resolution or resolve_resolution()
+    cache_key = (
+        digest, instruction, fast_mode, return_mode, mode,
+        tuple(sorted(codec.items())), tuple(sorted(resolution.items()))
+    )
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        if headers is not None:
+            headers["X-Cache"] = "hit"
+        return {**cached, "processing_time_ms": (time.time() - start_time) * 1000}
+
+    async def compute():
+        grounded_image, pred, report = await ground(image, instruction, digest, resolution, mode)
+
+        # Draw and encode off the event loop
+        result_id = store_result(grounded_image, pred, resized_key(digest, grounded_image))
+        if return_mode == "full":
+            result = await run_in_threadpool(render_result, grounded_image, pred, fast_mode, return_mode, codec)
+        else:
+            result = render_result(grounded_image, pred, fast_mode, return_mode)
+        result["result_id"] = result_id
+        result["image_size"] = {"width": w, "height": h}
+        result.update(report)
+        result["processing_time_ms"] = (time.time() - start_time) * 1000
+        result_cache.put(cache_key, result)
+        return result
 
-    # Skip attention map in fast mode
-    if fast_mode:
-        att_map = None
+    if SINGLE_FLIGHT:
+        result, coalesced = await in_flight.run(cache_key, compute)
     else:
-        n_width, n_height = pred["n_width"], pred["n_height"]
-        attn_scores = pred["attn_scores"]
-        att_map = get_attn_map(image, attn_scores, n_width, n_height)
+        result, coalesced = await compute(), False
+    if headers is not None:
+        headers["X-Cache"] = "coalesced" if coalesced else "miss"
+    if coalesced:
+        return {**result, "processing_time_ms": (time.time() - start_time) * 1000}
+    return result
+
+def stream_event(name: str, data: dict, sse: bool = False) -> bytes:
+    """One streamed event: an NDJSON line, or a Server-Sent Event when ``sse``"""
+    payload = dumps_json({"event": name, **data})
+    if sse:
+        return b"event: " + name.encode() + b"\ndata: " + payload + b"\n\n"
+    return payload + b"\n"
+
+async def process_stream(
+    image: Image.Image,
+    instruction: str,
+    fast_mode: bool = False,
+    return_mode: str = "full",
+    codec: Optional[dict] = None,
+    resolution: Optional[dict] = None,
+    mode: str = "single",
+    sse: bool = False
+):
+    """Ground the instruction, then return an async iterator of progressively available events
+
+    Events: ``coordinates`` (with top-k and the result_id) as soon as inference
+    is done, then ``image_with_point`` and ``attention_map`` as each is rendered
+    (only for ``return_mode="full"``; no attention map in fast mode), then
+    ``done``. Errors before the first event are raised as usual; later ones end
+    the stream with an ``error`` event instead of ``done``.
+    """
+    require_ready()
+    
+    start_time = time.time()
+    w, h = image.size
+    digest = await run_in_threadpool(pixel_digest, image)
+    codec = codec or resolve_codec()
+    resolution = resolution or resolve_resolution()
+    image, pred, report = await ground(image, instruction, digest, resolution, mode)
+    result_id = store_result(image, pred, resized_key(digest, image))
+
+    def elapsed_ms():
+        return (time.time() - start_time) * 1000
+
+    async def events():
+        yield stream_event("coordinates", {
+            **render_result(image, pred, return_mode="coords+topk"),
+            "result_id": result_id,
+            "image_size": {"width": w, "height": h},
+            **report,
+            "processing_time_ms": elapsed_ms()
+        }, sse)
+        try:
+            if return_mode == "full":
+                renders = [("image_with_point", render_overlay)]
+                if not fast_mode:
+                    renders.append(("attention_map", render_attention_map))
+                for name, render in renders:
+                    encoded = await run_in_threadpool(lambda: image_to_bytes(render(image, pred), codec))
+                    yield stream_event(name, {"image": data_url(encoded), "processing_time_ms": elapsed_ms()}, sse)
+        except Exception as e:
+            # The status code is already sent; tell the client the stream failed rather than just stopping
+            yield stream_event("error", {"detail": f"Error rendering images: {str(e)}", "processing_time_ms": elapsed_ms()}, sse)
+            return
+        yield stream_event("done", {"processing_time_ms": elapsed_ms()}, sse)
+
+    return events()
+
+async def process_multi(
+    image: Image.Image,
+    instructions: List[str],
+    fast_mode: bool = False,
+    return_mode: str = "full",
+    codec: Optional[dict] = None,
+    resolution: Optional[dict] = None,
+    mode: str = "single"
+):
+    """Ground several instructions on one screenshot, sharing the encoded image prefix"""
+    require_ready()
+    if mode != "single":
+        raise HTTPException(status_code=400, detail="/process-multi only supports mode=single")
     
-    post_time = time.time()
-    print(f"⏱️  Post-processing time: {(post_time - post_start)*1000:.1f}ms")
+    start_time = time.time()
+    w, h = image.size
+    image, image_key = await run_in_threadpool(prepare_image, image, None, resolution)
+    conversations = [build_conversation(image, instruction, image_key) for instruction in instructions]
+
+    try:
+        with stage("inference"):
+            preds = await submit_inference({"shared_prefix": conversations})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error during inference: {str(e)}")
 
+    def render_all():
+        return [
+            {
+                "instruction": instruction,
+                **render_result(image, pred, fast_mode, return_mode, codec),
+                "result_id": store_result(image, pred, image_key)
+            }
+            for instruction, pred in zip(instructions, preds)
+        ]
+
+    if return_mode == "full":
+        results = await run_in_threadpool(render_all)
+    else:
+        results = render_all()
     total_time = time.time() - start_time
-    print(f"⏱️  Total processing time: {total_time*1000:.1f}ms")
 
-    result = {
-        "image_with_point": image_to_base64(img_with_point),
-        "coordinates": output_coord,
-        "raw_coordinates": {"x": px, "y": py},
+    return {
+        "results": results,
         "image_size": {"width": w, "height": h},
+        **resolution_report(image, preds[0]),
         "processing_time_ms": total_time * 1000
     }
-    
-    if not fast_mode and att_map:
-        result["attention_map"] = image_to_base64(att_map)
-    
-    return result
+
+def parse_instructions(instructions: List[str]) -> List[str]:
+    """Accept repeated form fields or a single JSON array"""
+    if len(instructions) == 1 and instructions[0].lstrip().startswith('['):
+        try:
+            instructions = json.loads(instructions[0])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid instructions JSON: {str(e)}")
+    if not all(isinstance(instruction, str) for instruction in instructions):
+        raise HTTPException(status_code=400, detail="Instructions must be strings")
+    instructions = [instruction for instruction in instructions if instruction.strip()]
+    if not instructions:
+        raise HTTPException(status_code=400, detail="At least one instruction is required")
+    if len(instructions) > MAX_MULTI_INSTRUCTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_MULTI_INSTRUCTIONS} instructions per request")
+    return instructions
 
 @app.on_event("startup")
 async def startup_event():
-    """Load model on startup"""
-    load_model()
+    """Load model in the background so the server answers /livez and /readyz while it loads"""
+    app.state.model_loader = asyncio.create_task(run_in_threadpool(load_model))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the inference scheduler"""
+    if batcher is not None:
+        batcher.stop()
 
 @app.get("/")
 async def root():
@@ -249,7 +1079,17 @@ async def root():
         "description": "Coordinate-Free Visual Grounding for GUI Agents",
         "endpoints": {
             "/process": "POST - Process image and instruction",
-            "/health": "GET - Health check"
+            "/process-stream": "POST - Process image, streaming coordinates first and images as they render",
+            "/process-raw": "POST - Process an encoded image or raw pixel frame sent as the request body",
+            "/process-shm": "POST - Process a frame from a same-host shared-memory segment",
+            "/process-json": "POST - Process base64 images sent in a JSON body",
+            "/process-multi": "POST - Process image with several instructions",
+            "/results/{result_id}/overlay": "GET - Render the click-point overlay of a result",
+            "/results/{result_id}/attention-map": "GET - Render the attention map of a result",
+            "/health": "GET - Health check",
+            "/livez": "GET - Liveness probe",
+            "/readyz": "GET - Readiness probe with startup phases",
+            "/metrics": "GET - Prometheus metrics"
         }
     }
 
@@ -259,14 +1099,150 @@ async def health_check():
     return {
         "status": "healthy",
         "model_loaded": model is not None,
-        "cuda_available": torch.cuda.is_available()
+        "ready": startup_state["status"] == "ready",
+        "cuda_available": torch.cuda.is_available() if torch is not None else None,
+        "execution": execution_settings,
+        "batching": {
+            "max_batch_size": BATCH_MAX_SIZE,
+            "max_wait_ms": BATCH_MAX_WAIT_MS,
+            "queue_depth": batcher.queue_depth if batcher else 0,
+            "batch_sizes": dict(batcher.batch_sizes) if batcher else {},
+            "max_queue_size": INFERENCE_QUEUE_SIZE,
+            "rejected": batcher.rejected if batcher else 0
+        },
+        "vision_cache": vision_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "result_store": result_store.stats(),
+        "single_flight": in_flight.stats()
+    }
+
+@app.get("/livez")
+async def liveness_probe():
+    """Liveness: the server process and event loop are responsive"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readiness_probe():
+    """Readiness: 200 once the model is loaded and warmed up, 503 with per-phase progress before that"""
+    body = {
+        "status": startup_state["status"],
+        "phases": startup_state["phases"],
+        "uptime_ms": (time.time() - startup_state["started_at"]) * 1000
+    }
+    if startup_state["error"]:
+        body["error"] = startup_state["error"]
+    return JSONResponse(content=body, status_code=200 if startup_state["status"] == "ready" else 503)
+
+# Observed at scrape time from the components that own them
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+def process_memory_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux), or None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+@REGISTRY.collector
+def collect_server_metrics():
+    caches = {"vision": vision_cache, "result": result_cache, "result_store": result_store}
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    families = [
+        (f"gui_actor_cache_{key}", kind, help, [(f"gui_actor_cache_{key}", {"cache": name}, s[field]) for name, s in stats.items()])
+        for key, field, kind, help in (
+            ("hits_total", "hits", "counter", "Cache lookups that found an entry"),
+            ("misses_total", "misses", "counter", "Cache lookups that found nothing"),
+            ("evictions_total", "evictions", "counter", "Entries dropped to stay within the byte budget"),
+            ("bytes", "bytes", "gauge", "Bytes held by the cache"),
+            ("entries", "entries", "gauge", "Entries held by the cache"),
+        )
+    ]
+
+    batch_sizes = dict(batcher.batch_sizes) if batcher else {}
+    counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+    for size, n in batch_sizes.items():
+        counts[next((i for i, bound in enumerate(BATCH_SIZE_BUCKETS) if size <= bound), len(BATCH_SIZE_BUCKETS))] += n
+    families += [
+        ("gui_actor_queue_depth", "gauge", "Requests waiting for the inference worker",
+         [("gui_actor_queue_depth", {}, batcher.queue_depth if batcher else 0)]),
+        ("gui_actor_rejected_requests_total", "counter", "Requests rejected with 429 because the inference queue was full",
+         [("gui_actor_rejected_requests_total", {}, batcher.rejected if batcher else 0)]),
+        ("gui_actor_coalesced_requests_total", "counter", "Requests answered by joining an identical request already in flight",
+         [("gui_actor_coalesced_requests_total", {}, in_flight.coalesced)]),
+        ("gui_actor_in_flight_requests", "gauge", "Distinct requests currently being computed under single-flight",
+         [("gui_actor_in_flight_requests", {}, len(in_flight))]),
+        ("gui_actor_batch_size", "histogram", "Items per forward pass run by the micro-batcher",
+         histogram_samples("gui_actor_batch_size", BATCH_SIZE_BUCKETS, counts, sum(size * n for size, n in batch_sizes.items()))),
+    ]
+
+    memory = []
+    rss = process_memory_bytes()
+    if rss is not None:
+        memory.append(("process_resident_memory_bytes", "gauge", "Resident memory of the server process", rss))
+    if hasattr(model, "parameters"):
+        parameter_bytes = sum(p.numel() * p.element_size() for p in model.parameters())
+        memory.append(("gui_actor_model_parameter_bytes", "gauge", "Memory held by the model weights", parameter_bytes))
+    if torch is not None and torch.cuda.is_available():
+        memory += [
+            ("gui_actor_cuda_memory_allocated_bytes", "gauge", "CUDA memory allocated by tensors", torch.cuda.memory_allocated()),
+            ("gui_actor_cuda_memory_reserved_bytes", "gauge", "CUDA memory reserved by the caching allocator", torch.cuda.memory_reserved()),
+            ("gui_actor_cuda_memory_max_allocated_bytes", "gauge", "Peak CUDA memory allocated by tensors", torch.cuda.max_memory_allocated()),
+        ]
+    families += [(name, kind, help, [(name, {}, value)]) for name, kind, help, value in memory]
+    return families
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: per-stage and per-route latency histograms, cache, queue, batching and memory"""
+    return Response(content=REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+def response_type(accept: Optional[str] = Header(None)) -> str:
+    """Response media type negotiated from the Accept header: JSON (default), msgpack or multipart/mixed"""
+    media_type = negotiate(accept)
+    if media_type is None:
+        raise HTTPException(status_code=406, detail="Acceptable types: application/json, application/msgpack, multipart/mixed")
+    return media_type
+
+def process_options(
+    fast_mode: bool = Form(False),
+    return_mode: str = Form("full", alias="return"),
+    image_codec: Optional[str] = Form(None),
+    image_quality: Optional[int] = Form(None),
+    png_compress_level: Optional[int] = Form(None),
+    tier: Optional[str] = Form(None),
+    max_pixels: Optional[int] = Form(None),
+    min_pixels: Optional[int] = Form(None),
+    mode: str = Form("single")
+) -> dict:
+    """
+    Form options shared by the /process* endpoints
+    
+    Args:
+        fast_mode: Skip the attention map
+        return: "coords", "coords+topk" or "full" (default, includes rendered images)
+        image_codec: "png", "webp" or "jpeg" for rendered images (server default: IMAGE_CODEC)
+        image_quality: WebP/JPEG quality 1-100
+        png_compress_level: PNG compression level 0-9
+        tier: Named pixel budget, "fast", "balanced" or "precise"
+        max_pixels: Explicit pixel budget, overrides tier (default: MAX_PIXELS)
+        min_pixels: Smaller images are upscaled to this many pixels (default: MIN_PIXELS)
+        mode: "single" (default), "coarse_to_fine" for large screenshots or "tiled" for ultra-wide captures
+    """
+    return {
+        "fast_mode": fast_mode,
+        "return_mode": check_return_mode(return_mode),
+        "codec": resolve_codec(image_codec, image_quality, png_compress_level),
+        "resolution": resolve_resolution(tier, max_pixels, min_pixels),
+        "mode": check_mode(mode)
     }
 
 @app.post("/process")
 async def process_image(
     image: UploadFile = File(...),
     instruction: str = Form(...),
-    fast_mode: bool = Form(False)
+    options: dict = Depends(process_options),
+    media_type: str = Depends(response_type)
 ):
     """
     Process an image with an instruction to locate GUI elements
@@ -274,9 +1250,11 @@ async def process_image(
     Args:
         image: Uploaded image file
         instruction: Text instruction describing what to find
+        options: Shared form options, see process_options
+        media_type: From the Accept header, see response_type
     
     Returns:
-        JSON response with processed results
+        Processed results, encoded per the Accept header (JSON by default)
     """
     # Validate file type
     if not image.content_type.startswith('image/'):
@@ -284,21 +1262,193 @@ async def process_image(
     
     try:
         # Read and convert image
-        image_data = await image.read()
-        pil_image = Image.open(io.BytesIO(image_data)).convert('RGB')
+        image_data = await read_upload(image)
+        pil_image = await run_in_threadpool(decode_image, image_data)
         
         # Process the image
-        result = process(pil_image, instruction)
+        headers = {}
+        result = await process(pil_image, instruction, **options, headers=headers)
+        
+        return encode_response(result, media_type, headers)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+def query_options(
+    fast_mode: bool = False,
+    return_mode: str = Query("full", alias="return"),
+    image_codec: Optional[str] = None,
+    image_quality: Optional[int] = None,
+    png_compress_level: Optional[int] = None,
+    tier: Optional[str] = None,
+    max_pixels: Optional[int] = None,
+    min_pixels: Optional[int] = None,
+    mode: str = "single"
+) -> dict:
+    """Query-string variant of process_options, for endpoints whose body is the image itself"""
+    return process_options(
+        fast_mode, return_mode, image_codec, image_quality, png_compress_level, tier, max_pixels, min_pixels, mode
+    )
+
+@app.post("/process-stream")
+async def process_stream_image(
+    image: UploadFile = File(...),
+    instruction: str = Form(...),
+    options: dict = Depends(process_options),
+    accept: Optional[str] = Header(None)
+):
+    """
+    Streaming /process: coordinates first, rendered images as they become ready
+    
+    Sends newline-delimited JSON (application/x-ndjson), or Server-Sent Events
+    when the Accept header asks for text/event-stream. Every event has an
+    "event" field: coordinates, image_with_point, attention_map, then done,
+    or error (with a "detail" message) if rendering failed mid-stream.
+    
+    Args:
+        image: Uploaded image file
+        instruction: Text instruction describing what to find
+        options: Shared form options, see process_options
+        accept: text/event-stream for SSE framing
+    """
+    if not image.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    sse = "text/event-stream" in (accept or "")
+    
+    try:
+        image_data = await read_upload(image)
+        pil_image = await run_in_threadpool(decode_image, image_data)
+        
+        events = await process_stream(pil_image, instruction, **options, sse=sse)
+        
+        return StreamingResponse(
+            events,
+            media_type="text/event-stream" if sse else "application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+@app.post("/process-raw")
+async def process_raw_image(
+    request: Request,
+    instruction: str,
+    options: dict = Depends(query_options),
+    media_type: str = Depends(response_type)
+):
+    """
+    Process an image sent as the raw request body (application/octet-stream or image/*)
+    
+    The body is read into memory up to MAX_UPLOAD_MB instead of being spooled to a
+    temp file, and decoded once, straight to the model input size (JPEGs at a
+    reduced DCT scale). Multi-pass modes crop at native resolution and decode
+    at full size.
+    
+    With Content-Type application/x-gui-actor-frame the body is a raw pixel
+    frame (see rawframe.py) and skips image decoding altogether.
+    
+    Args:
+        request: Body is the encoded image
+        instruction: Text instruction describing what to find (query parameter)
+        options: Shared options as query parameters, see process_options
+        media_type: From the Accept header, see response_type
+    
+    Returns:
+        Processed results, encoded per the Accept header (JSON by default)
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith(("image/", "application/octet-stream", rawframe.CONTENT_TYPE)):
+        raise HTTPException(
+            status_code=415, detail=f"Body must be application/octet-stream, image/* or {rawframe.CONTENT_TYPE}"
+        )
+    
+    try:
+        image_data = await read_body(request)
+        if content_type.startswith(rawframe.CONTENT_TYPE):
+            with stage("decode"):
+                pil_image, source_size = await run_in_threadpool(rawframe.frame_to_image, image_data, MAX_PIXELS_LIMIT), None
+        else:
+            resolution = options["resolution"] if options["mode"] == "single" else None
+            pil_image, source_size = await run_in_threadpool(decode_image_at, image_data, resolution)
+        
+        headers = {}
+        result = await process(pil_image, instruction, **options, source_size=source_size, headers=headers)
+        
+        return encode_response(result, media_type, headers)
+        
+    except HTTPException:
+        raise
+    except rawframe.FrameError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid frame: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+@app.post("/process-shm")
+async def process_shm_image(
+    request: Request,
+    shm_name: str = Form(...),
+    shape: str = Form(...),
+    instruction: str = Form(...),
+    offset: int = Form(0),
+    dtype: str = Form("uint8"),
+    pixel_format: Optional[str] = Form(None),
+    stride: Optional[int] = Form(None),
+    options: dict = Depends(process_options),
+    media_type: str = Depends(response_type)
+):
+    """
+    Process a frame a same-host client left in shared memory
+    
+    The segment is mapped read-only and unpacked straight to an RGB image; no
+    image bytes go over HTTP. See shm.ShmFrameRing for the client side.
+    
+    Args:
+        shm_name: /dev/shm segment name, or memfd:<pid>/<fd>
+        shape: "height,width,channels" (or a JSON array)
+        instruction: Text instruction describing what to find
+        offset: Byte offset of the frame in the segment
+        dtype: Element type, only "uint8"
+        pixel_format: RGB, BGR, RGBA or BGRA (default: RGB / RGBA by channel count)
+        stride: Bytes per row if rows are padded
+        options: Shared form options, see process_options
+        media_type: From the Accept header, see response_type
+    
+    Returns:
+        Processed results, encoded per the Accept header (JSON by default)
+    """
+    if "*" not in SHM_ALLOWED_CLIENTS and (request.client is None or request.client.host not in SHM_ALLOWED_CLIENTS):
+        raise HTTPException(status_code=403, detail="Shared-memory input is only accepted from local clients")
+    
+    try:
+        dims = json.loads(shape) if shape.lstrip().startswith('[') else [int(v) for v in shape.split(',')]
+        with stage("decode"):
+            pil_image = await run_in_threadpool(
+                shm.read_image, shm_name, offset, dims, dtype, pixel_format, stride, MAX_PIXELS_LIMIT
+            )
+        
+        headers = {}
+        result = await process(pil_image, instruction, **options, headers=headers)
         
-        return JSONResponse(content=result)
+        return encode_response(result, media_type, headers)
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid shared-memory frame: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 @app.post("/process-base64")
 async def process_base64_image(
     image_base64: str = Form(...),
-    instruction: str = Form(...)
+    instruction: str = Form(...),
+    options: dict = Depends(process_options),
+    media_type: str = Depends(response_type)
 ):
     """
     Process an image (base64 encoded) with an instruction
@@ -306,27 +1456,188 @@ async def process_base64_image(
     Args:
         image_base64: Base64 encoded image string
         instruction: Text instruction describing what to find
+        options: Shared form options, see process_options
+        media_type: From the Accept header, see response_type
     
     Returns:
-        JSON response with processed results
+        Processed results, encoded per the Accept header (JSON by default)
     """
     try:
         # Decode base64 image
-        if image_base64.startswith('data:image'):
-            # Remove data URL prefix
-            image_base64 = image_base64.split(',')[1]
-        
-        image_data = base64.b64decode(image_base64)
-        pil_image = Image.open(io.BytesIO(image_data)).convert('RGB')
+        pil_image = await run_in_threadpool(decode_base64_image, image_base64)
         
         # Process the image
-        result = process(pil_image, instruction)
+        headers = {}
+        result = await process(pil_image, instruction, **options, headers=headers)
         
-        return JSONResponse(content=result)
+        return encode_response(result, media_type, headers)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing base64 image: {str(e)}")
 
+@app.post("/process-json")
+async def process_json(
+    request: Request,
+    media_type: str = Depends(response_type)
+):
+    """
+    Process base64 images sent in a JSON body, without form parsing
+    
+    Body fields:
+        image: Base64 image (optionally a data URL), or
+        images: Up to MAX_JSON_IMAGES base64 images, run concurrently
+        instruction: Instruction for every image, or
+        instructions: One instruction per image
+        fast_mode, return, image_codec, image_quality, png_compress_level,
+        tier, max_pixels, min_pixels, mode: As in process_options
+    
+    The body is parsed with orjson when available and base64 is decoded
+    straight to bytes. The memory the request holds (body, base64 text,
+    decoded bytes and pixels) is accounted and capped at MAX_REQUEST_MEMORY_MB;
+    the peak is reported in the X-Request-Memory header.
+    
+    Returns:
+        The /process result for a single image, or {"results": [...]} in image
+        order, encoded per the Accept header
+    """
+    if not request.headers.get("content-type", "").startswith("application/json"):
+        raise HTTPException(status_code=415, detail="Body must be application/json")
+    limit = MAX_REQUEST_MEMORY_MB * 1024 * 1024
+    
+    try:
+        # Parsing holds the body and the base64 text it contains at the same time
+        body = await read_body(request, limit // 2)
+        try:
+            payload = loads_json(body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
+        if not isinstance(payload, dict):
+            raise HTTPException(status_code=400, detail="Body must be a JSON object")
+        body_bytes = len(body)
+        del body
+        
+        single = "image" in payload
+        images = [payload.pop("image")] if single else payload.pop("images", None)
+        if not images or not isinstance(images, list) or not all(isinstance(image, str) for image in images):
+            raise HTTPException(status_code=400, detail="Provide image (string) or images (list of strings)")
+        if len(images) > MAX_JSON_IMAGES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_JSON_IMAGES} images per request")
+        instructions = payload.get("instructions")
+        if instructions is None:
+            instructions = [payload.get("instruction")] * len(images)
+        if (
+            not isinstance(instructions, list) or len(instructions) != len(images)
+            or not all(isinstance(i, str) and i.strip() for i in instructions)
+        ):
+            raise HTTPException(status_code=400, detail="Provide instruction, or one instruction per image")
+        fast_mode = payload.get("fast_mode", False)
+        if not isinstance(fast_mode, bool):
+            raise HTTPException(status_code=400, detail="fast_mode must be true or false")
+        for name in ("image_quality", "png_compress_level", "max_pixels", "min_pixels"):
+            value = payload.get(name)
+            # bool is an int subclass; JSON true/false is not a number here
+            if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+                raise HTTPException(status_code=400, detail=f"{name} must be an integer")
+        try:
+            options = process_options(
+                fast_mode, payload.get("return", "full"),
+                payload.get("image_codec"), payload.get("image_quality"), payload.get("png_compress_level"),
+                payload.get("tier"), payload.get("max_pixels"), payload.get("min_pixels"), payload.get("mode", "single")
+            )
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid option types")
+        
+        # The body is released; the base64 text is held until every image is decoded
+        resolution = options["resolution"] if options["mode"] == "single" else None
+        text_bytes = sum(len(image) for image in images)
+        decoded, peak = await run_in_threadpool(decode_json_images, images, resolution, text_bytes, limit)
+        peak = max(peak, body_bytes + text_bytes)
+        del images
+        
+        headers = {}
+        results = await asyncio.gather(*(
+            process(image, instruction, **options, source_size=source_size, headers=headers if single else None)
+            for (image, source_size), instruction in zip(decoded, instructions)
+        ))
+        headers["X-Request-Memory"] = str(peak)
+        return encode_response(results[0] if single else {"results": results}, media_type, headers)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing JSON request: {str(e)}")
+
+@app.post("/process-multi")
+async def process_multi_image(
+    image: UploadFile = File(...),
+    instructions: List[str] = Form(...),
+    options: dict = Depends(process_options),
+    media_type: str = Depends(response_type)
+):
+    """
+    Locate several GUI elements on the same screenshot in one request
+    
+    Args:
+        image: Uploaded image file
+        instructions: Instructions, as repeated form fields or one JSON array
+        options: Shared form options, see process_options
+        media_type: From the Accept header, see response_type
+    
+    Returns:
+        One result per instruction, in order, encoded per the Accept header
+    """
+    if not image.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    try:
+        instructions = parse_instructions(instructions)
+        image_data = await read_upload(image)
+        pil_image = await run_in_threadpool(decode_image, image_data)
+        
+        result = await process_multi(pil_image, instructions, **options)
+        
+        return encode_response(result, media_type)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+def get_stored_result(result_id: str) -> dict:
+    entry = result_store.get(result_id)
+    image = result_store.get(("image", entry["image_key"])) if entry is not None else None
+    if image is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired result_id")
+    return {"image": image, "pred": entry["pred"]}
+
+@app.get("/results/{result_id}/overlay")
+async def get_result_overlay(
+    result_id: str,
+    image_codec: Optional[str] = None,
+    image_quality: Optional[int] = None,
+    png_compress_level: Optional[int] = None
+):
+    """Render the click-point overlay for an earlier result"""
+    entry = get_stored_result(result_id)
+    codec = resolve_codec(image_codec, image_quality, png_compress_level)
+    content, mime_type = await run_in_threadpool(lambda: image_to_bytes(render_overlay(entry["image"], entry["pred"]), codec))
+    return Response(content=content, media_type=mime_type)
+
+@app.get("/results/{result_id}/attention-map")
+async def get_result_attention_map(
+    result_id: str,
+    image_codec: Optional[str] = None,
+    image_quality: Optional[int] = None,
+    png_compress_level: Optional[int] = None
+):
+    """Render the attention map for an earlier result"""
+    entry = get_stored_result(result_id)
+    codec = resolve_codec(image_codec, image_quality, png_compress_level)
+    content, mime_type = await run_in_threadpool(lambda: image_to_bytes(render_attention_map(entry["image"], entry["pred"]), codec))
+    return Response(content=content, media_type=mime_type)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8080) 
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""
+Prometheus text-format metrics without a client library, and sampled request logs.
+
+Instruments are thread-safe because stages run on the event loop, in threadpool
+workers and on the inference thread. ``stage(name)`` times one pipeline stage
+into the ``gui_actor_stage_seconds`` histogram. When a request is being tracked
+(``track_request``), it also adds the time to that request's stage durations,
+which end up in the request log.
+
+Values owned by other components (cache stats, queue depth, memory) are read
+when ``/metrics`` is scraped, through ``REGISTRY.collector`` callbacks.
+"""
+
+import json
+import logging
+import math
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; stages range from sub-millisecond (draw) to seconds (inference on CPU)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# A metric family as rendered: (name, type, help, [(sample name, labels, value)])
+Family = Tuple[str, str, str, Sequence[Tuple[str, Dict[str, str], float]]]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def histogram_samples(name: str, buckets: Sequence[float], counts: Sequence[int], total: float, labels=None):
+    """Samples of one histogram series from per-bucket (non-cumulative) counts, the last one being +Inf"""
+    labels = labels or {}
+    samples, cumulative = [], 0
+    for bound, count in zip(list(buckets) + [math.inf], counts):
+        cumulative += count
+        samples.append((f"{name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+    samples.append((f"{name}_sum", labels, total))
+    samples.append((f"{name}_count", labels, cumulative))
+    return samples
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series: Dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> dict:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def collect(self) -> Family:
+        with self._lock:
+            series = list(self._series.items())
+        return self.name, self.type, self.help, [(self.name, self._labels(key), value) for key, value in series]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = float(value)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self) -> Family:
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        samples = []
+        for key, counts, total in series:
+            samples.extend(histogram_samples(self.name, self.buckets, counts, total, self._labels(key)))
+        return self.name, self.type, self.help, samples
+
+
+class Registry:
+    """Instruments plus scrape-time collectors, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collector(self, fn: Callable[[], Iterable[Family]]):
+        """Register ``fn`` (usable as a decorator); it returns metric families computed at scrape time"""
+        self.collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        families = [metric.collect() for metric in self.metrics]
+        for collect in self.collectors:
+            families.extend(collect())
+        lines = []
+        for name, type_, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {type_}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "gui_actor_stage_seconds",
+    "Time spent per pipeline stage (upload_read, decode, resize, preprocess, inference, draw, attention_map, encode)",
+    ("stage",),
+)
+
+# Start time and stage durations (seconds) of the request being handled, if it is tracked
+_request_stages: ContextVar[Optional[dict]] = ContextVar("request_stages", default=None)
+_request_started: ContextVar[Optional[float]] = ContextVar("request_started", default=None)
+
+
+@contextmanager
+def track_request():
+    """Collect the ``stage`` timings of the current request (and the tasks/threads it spawns) into a dict"""
+    stages = {}
+    tokens = _request_stages.set(stages), _request_started.set(time.perf_counter())
+    try:
+        yield stages
+    finally:
+        _request_stages.reset(tokens[0])
+        _request_started.reset(tokens[1])
+
+
+def request_elapsed() -> float:
+    """Seconds since the tracked request started (0 outside one)"""
+    started = _request_started.get()
+    return time.perf_counter() - started if started is not None else 0.0
+
+
+def record_stage(name: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block into the stage histogram and the current request's stage durations"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+# One JSON object per line on stdout, for sampled requests only
+request_log = logging.getLogger("gui_actor.requests")
+if not request_log.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    request_log.addHandler(_handler)
+    request_log.setLevel(logging.INFO)
+    request_log.propagate = False
+
+
+def log_request(**fields):
+    request_log.info(json.dumps(fields, separators=(",", ":"), default=str))
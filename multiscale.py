@@ -0,0 +1,126 @@
+"""
+Geometry for multi-pass grounding on large screenshots.
+
+Predictions are normalized to the image the model saw. These helpers pick
+native-resolution windows around candidate points, lay out overlapping tiles
+over wide captures, and map points and attention scores found inside a
+window or tile back to the full frame.
+"""
+
+import math
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+Box = Tuple[int, int, int, int]
+
+
+def crop_box(point: Sequence[float], image_size: Tuple[int, int], window: Tuple[int, int]) -> Box:
+    """``window``-sized (left, top, right, bottom) box centred on a normalized point, shifted to stay inside the image"""
+    width, height = image_size
+    w, h = min(window[0], width), min(window[1], height)
+    left = min(max(0, round(point[0] * width - w / 2)), width - w)
+    top = min(max(0, round(point[1] * height - h / 2)), height - h)
+    return left, top, left + w, top + h
+
+
+def overlap(a: Box, b: Box) -> float:
+    """Intersection area over the smaller box's area"""
+    w = min(a[2], b[2]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[1], b[1])
+    if w <= 0 or h <= 0:
+        return 0.0
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return w * h / smaller
+
+
+def candidate_boxes(points, image_size, window, limit: int, max_overlap: float = 0.5) -> List[Box]:
+    """Windows around the best ``limit`` points, skipping points whose window mostly repeats an earlier one"""
+    boxes: List[Box] = []
+    for point in points:
+        box = crop_box(point, image_size, window)
+        if all(overlap(box, other) <= max_overlap for other in boxes):
+            boxes.append(box)
+        if len(boxes) >= limit:
+            break
+    return boxes
+
+
+def to_global(point: Sequence[float], box: Box, image_size: Tuple[int, int]) -> Tuple[float, float]:
+    """Map a point normalized to ``box`` back to coordinates normalized to the full image"""
+    left, top, right, bottom = box
+    return (
+        (left + point[0] * (right - left)) / image_size[0],
+        (top + point[1] * (bottom - top)) / image_size[1],
+    )
+
+
+def _spans(length: int, tile: int, overlap: float) -> List[Tuple[int, int]]:
+    tile = min(tile, length)
+    if tile >= length:
+        return [(0, length)]
+    count = math.ceil((length - tile * overlap) / (tile * (1 - overlap)))
+    step = (length - tile) / (count - 1)
+    return [(round(i * step), round(i * step) + tile) for i in range(count)]
+
+
+def tile_boxes(image_size: Tuple[int, int], tile_size: Tuple[int, int], overlap: float = 0.1, max_tiles: int = 8) -> List[Box]:
+    """Tiles of ``tile_size`` covering the image, spread evenly with at least ``overlap`` between neighbours.
+
+    Tiles grow when more than ``max_tiles`` would be needed.
+    """
+    width, height = image_size
+    tile_w, tile_h = tile_size
+    while True:
+        columns, rows = _spans(width, tile_w, overlap), _spans(height, tile_h, overlap)
+        if len(columns) * len(rows) <= max_tiles:
+            return [(left, top, right, bottom) for top, bottom in rows for left, right in columns]
+        tile_w, tile_h = math.ceil(tile_w * 1.25), math.ceil(tile_h * 1.25)
+
+
+def merge_tile_scores(boxes: Sequence[Box], preds: Sequence[dict], image_size: Tuple[int, int]) -> np.ndarray:
+    """Paste per-tile attention grids into one global grid at the tiles' patch size, keeping the max where tiles overlap"""
+    width, height = image_size
+    first_w = boxes[0][2] - boxes[0][0]
+    first_h = boxes[0][3] - boxes[0][1]
+    grid_w = max(1, round(width * preds[0]["n_width"] / first_w))
+    grid_h = max(1, round(height * preds[0]["n_height"] / first_h))
+    centers_x = (np.arange(grid_w) + 0.5) * width / grid_w
+    centers_y = (np.arange(grid_h) + 0.5) * height / grid_h
+    merged = np.zeros((grid_h, grid_w), dtype=np.float32)
+    for (left, top, right, bottom), pred in zip(boxes, preds):
+        n_width, n_height = pred["n_width"], pred["n_height"]
+        scores = np.asarray(pred["attn_scores"], dtype=np.float32).reshape(-1, n_height * n_width)[0].reshape(n_height, n_width)
+        columns = np.nonzero((centers_x >= left) & (centers_x < right))[0]
+        rows = np.nonzero((centers_y >= top) & (centers_y < bottom))[0]
+        ix = np.clip(((centers_x[columns] - left) * n_width / (right - left)).astype(int), 0, n_width - 1)
+        iy = np.clip(((centers_y[rows] - top) * n_height / (bottom - top)).astype(int), 0, n_height - 1)
+        cells = np.ix_(rows, columns)
+        merged[cells] = np.maximum(merged[cells], scores[np.ix_(iy, ix)])
+    return merged
+
+
+def merge_tile_points(boxes: Sequence[Box], preds: Sequence[dict], merged: np.ndarray, image_size: Tuple[int, int], topk: int):
+    """Global top-k: every tile's points mapped to the full frame, ranked by the merged score at that point.
+
+    A point within one global cell of a better one is the same target seen by
+    two overlapping tiles and is dropped. Returns (points, values).
+    """
+    grid_h, grid_w = merged.shape
+    candidates = []
+    for box, pred in zip(boxes, preds):
+        for point in pred["topk_points"]:
+            x, y = to_global(point, box, image_size)
+            cell = merged[min(grid_h - 1, int(y * grid_h)), min(grid_w - 1, int(x * grid_w))]
+            candidates.append((float(cell), (x, y)))
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+    points, values = [], []
+    for value, (x, y) in candidates:
+        if any(abs(x - px) * grid_w < 1 and abs(y - py) * grid_h < 1 for px, py in points):
+            continue
+        points.append((x, y))
+        values.append(value)
+        if len(points) >= topk:
+            break
+    return points, values
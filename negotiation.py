@@ -0,0 +1,145 @@
+"""
+Response encodings chosen by the request's ``Accept`` header.
+
+Results carry rendered images as ``(bytes, mime_type)`` tuples. Only the
+encoding step decides how they go over the wire:
+
+* ``application/json`` (default): images become ``data:`` URLs, as before;
+  serialized with orjson when it is installed.
+* ``application/msgpack``: the same tree with images as
+  ``{"mime_type": ..., "data": <bin>}``; no base64 anywhere.
+* ``multipart/mixed``: a JSON part with everything but the images, then one
+  part per image with its raw bytes, named by its path in the result
+  (``image_with_point``, ``results.0.attention_map``, ...).
+
+The orjson-or-json helpers are also used to parse JSON request bodies.
+"""
+
+import base64
+import json
+import uuid
+from typing import Optional
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+MULTIPART = "multipart/mixed"
+_ALIASES = {
+    "*/*": JSON,
+    "application/*": JSON,
+    JSON: JSON,
+    MSGPACK: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    MULTIPART: MULTIPART,
+    "multipart/*": MULTIPART,
+}
+
+
+def is_image(value) -> bool:
+    return isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], (bytes, bytearray))
+
+
+def data_url(image) -> str:
+    content, mime_type = image
+    return f"data:{mime_type};base64,{base64.b64encode(content).decode()}"
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """Best available media type for an ``Accept`` header, or None if nothing acceptable is available"""
+    if not accept:
+        return JSON
+    ranked = []
+    for position, item in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            ranked.append((-q, position, media_type.lower()))
+    for _, _, media_type in sorted(ranked):
+        chosen = _ALIASES.get(media_type)
+        if chosen == MSGPACK and msgpack is None:
+            continue
+        if chosen is not None:
+            return chosen
+    return None
+
+
+def _map_images(value, convert):
+    if is_image(value):
+        return convert(value)
+    if isinstance(value, dict):
+        return {key: _map_images(item, convert) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_map_images(item, convert) for item in value]
+    return value
+
+
+def _split_images(value, path="", images=None):
+    """Return (tree without images, [(path, image)])"""
+    if images is None:
+        images = []
+    if isinstance(value, dict):
+        tree = {}
+        for key, item in value.items():
+            item_path = f"{path}.{key}" if path else str(key)
+            if is_image(item):
+                images.append((item_path, item))
+            else:
+                tree[key] = _split_images(item, item_path, images)[0]
+        return tree, images
+    if isinstance(value, list):
+        return [_split_images(item, f"{path}.{i}", images)[0] for i, item in enumerate(value)], images
+    return value, images
+
+
+def dumps_json(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def loads_json(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_response(result: dict, media_type: str = JSON, headers: Optional[dict] = None) -> Response:
+    """Serialize a result in the negotiated media type"""
+    if media_type == MSGPACK:
+        body = msgpack.packb(_map_images(result, lambda image: {"mime_type": image[1], "data": image[0]}))
+        return Response(content=body, media_type=MSGPACK, headers=headers)
+    if media_type == MULTIPART:
+        tree, images = _split_images(result)
+        boundary = uuid.uuid4().hex
+        chunks = [
+            f"--{boundary}\r\nContent-Type: {JSON}\r\nContent-Disposition: inline; name=\"result\"\r\n\r\n".encode(),
+            dumps_json(tree),
+        ]
+        for path, (content, mime_type) in images:
+            chunks.append(
+                f"\r\n--{boundary}\r\nContent-Type: {mime_type}\r\nContent-Disposition: inline; name=\"{path}\"\r\n"
+                f"Content-Length: {len(content)}\r\n\r\n".encode()
+            )
+            chunks.append(content)
+        chunks.append(f"\r\n--{boundary}--\r\n".encode())
+        return Response(content=b"".join(chunks), media_type=f"{MULTIPART}; boundary={boundary}", headers=headers)
+    return Response(content=dumps_json(_map_images(result, data_url)), media_type=JSON, headers=headers)
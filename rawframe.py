@@ -0,0 +1,166 @@
+"""
+Raw pixel frames: screenshots sent as captured, without PNG encode/decode.
+
+A frame is a 20-byte little-endian header followed by the pixel rows::
+
+    magic    4s   b"GAF1"
+    format   B    PIXEL_FORMATS code (RGB, BGR, RGBA, BGRA)
+    codec    B    COMPRESSIONS code (none, lz4, zstd)
+    reserved H
+    width    I
+    height   I
+    stride   I    bytes per row, >= width * channels (row padding is allowed)
+
+Rows are optionally compressed as one LZ4 frame or zstd frame (``pip install
+lz4`` / ``pip install zstandard``). Uncompressed rows are wrapped in place
+as a NumPy array, so the only pass over the pixels on the server is the
+unpack to RGB (alpha dropped, BGR swapped).
+"""
+
+import struct
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CONTENT_TYPE = "application/x-gui-actor-frame"
+MAGIC = b"GAF1"
+HEADER = struct.Struct("<4sBBHIII")
+# name -> (header code, channels, Pillow raw mode that unpacks it to RGB)
+PIXEL_FORMATS = {
+    "RGB": (1, 3, "RGB"),
+    "BGR": (2, 3, "BGR"),
+    "RGBA": (3, 4, "RGBX"),
+    "BGRA": (4, 4, "BGRX"),
+}
+COMPRESSIONS = {None: 0, "lz4": 1, "zstd": 2}
+_FORMAT_NAMES = {code: name for name, (code, _, _) in PIXEL_FORMATS.items()}
+_COMPRESSION_NAMES = {code: name for name, code in COMPRESSIONS.items()}
+
+
+class FrameError(ValueError):
+    """Malformed or unsupported frame"""
+
+
+def compress(data, compression: Optional[str]) -> bytes:
+    if compression is None:
+        return data
+    if compression == "lz4":
+        if lz4_frame is None:
+            raise FrameError("lz4 is not installed")
+        return lz4_frame.compress(data)
+    if compression == "zstd":
+        if zstandard is None:
+            raise FrameError("zstandard is not installed")
+        return zstandard.ZstdCompressor(level=1).compress(data)
+    raise FrameError(f"Unsupported compression {compression!r}")
+
+
+def decompress(data, compression: Optional[str], max_size: int):
+    """Decompress at most ``max_size`` bytes, so a small body cannot expand without bound"""
+    if compression is None:
+        return data
+    if compression == "lz4":
+        if lz4_frame is None:
+            raise FrameError("Frame is lz4-compressed but lz4 is not installed")
+        try:
+            return lz4_frame.LZ4FrameDecompressor().decompress(data, max_length=max_size)
+        except RuntimeError as e:
+            raise FrameError(f"Invalid lz4 data: {e}")
+    if zstandard is None:
+        raise FrameError("Frame is zstd-compressed but zstandard is not installed")
+    try:
+        if zstandard.frame_content_size(data) > max_size:
+            raise FrameError("Decompressed frame is larger than stride * height")
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=max_size)
+    except zstandard.ZstdError as e:
+        raise FrameError(f"Invalid zstd data: {e}")
+
+
+def encode_frame(
+    pixels,
+    pixel_format: str = "RGB",
+    size: Optional[Tuple[int, int]] = None,
+    stride: Optional[int] = None,
+    compression: Optional[str] = None,
+) -> bytes:
+    """Frame a capture buffer.
+
+    ``pixels`` is a (height, width, channels) uint8 array, or a bytes-like
+    buffer together with ``size`` (width, height) and optionally ``stride``
+    (e.g. mss gives BGRA rows, Playwright/pyautogui images give RGB).
+    """
+    if pixel_format not in PIXEL_FORMATS:
+        raise FrameError(f"Unsupported pixel format {pixel_format!r}")
+    code, channels, _ = PIXEL_FORMATS[pixel_format]
+    if isinstance(pixels, np.ndarray):
+        if pixels.ndim != 3 or pixels.shape[2] != channels:
+            raise FrameError(f"{pixel_format} arrays must be (height, width, {channels})")
+        height, width = pixels.shape[:2]
+        pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+        stride = width * channels
+    else:
+        if size is None:
+            raise FrameError("size is required for raw buffers")
+        width, height = size
+        stride = stride or width * channels
+    if len(memoryview(pixels).cast("B")) < stride * height:
+        raise FrameError("Buffer is smaller than stride * height")
+    if compression not in COMPRESSIONS:
+        raise FrameError(f"Unsupported compression {compression!r}")
+    header = HEADER.pack(MAGIC, code, COMPRESSIONS[compression], 0, width, height, stride)
+    return header + compress(memoryview(pixels).cast("B")[: stride * height], compression)
+
+
+def read_frame(data, max_pixels: Optional[int] = None) -> Tuple[dict, np.ndarray]:
+    """Parse a frame; returns (header, rows) with rows a (height, stride) uint8 view of the pixel data.
+
+    Uncompressed frames are not copied: ``rows`` shares memory with ``data``.
+    With ``max_pixels``, larger frames (or rows padded beyond four bytes per
+    pixel of that budget) are rejected before anything is decompressed.
+    """
+    if len(data) < HEADER.size:
+        raise FrameError("Frame is shorter than its header")
+    magic, code, compression_code, _, width, height, stride = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise FrameError("Not a raw frame (bad magic)")
+    if code not in _FORMAT_NAMES or compression_code not in _COMPRESSION_NAMES:
+        raise FrameError("Unsupported pixel format or compression")
+    name = _FORMAT_NAMES[code]
+    channels = PIXEL_FORMATS[name][1]
+    if width == 0 or height == 0 or stride < width * channels:
+        raise FrameError("Invalid width, height or stride")
+    if max_pixels is not None and (width * height > max_pixels or stride * height > max_pixels * 4):
+        raise FrameError(f"Frame is larger than {max_pixels} pixels")
+    body = decompress(memoryview(data)[HEADER.size:], _COMPRESSION_NAMES[compression_code], stride * height)
+    if len(body) < stride * height:
+        raise FrameError("Frame is shorter than stride * height")
+    rows = np.frombuffer(body, dtype=np.uint8, count=stride * height).reshape(height, stride)
+    header = {"pixel_format": name, "channels": channels, "width": width, "height": height, "stride": stride}
+    return header, rows
+
+
+def frame_pixels(header: dict, rows: np.ndarray) -> np.ndarray:
+    """(height, width, channels) view of ``rows`` without the row padding, still zero-copy"""
+    return rows[:, : header["width"] * header["channels"]].reshape(header["height"], header["width"], header["channels"])
+
+
+def rows_to_image(rows, width: int, height: int, stride: int, pixel_format: str) -> Image.Image:
+    """Unpack ``height`` rows of ``stride`` bytes in ``pixel_format`` to an RGB image in a single pass"""
+    return Image.frombytes("RGB", (width, height), rows, "raw", PIXEL_FORMATS[pixel_format][2], stride, 1)
+
+
+def frame_to_image(data, max_pixels: Optional[int] = None) -> Image.Image:
+    """Decode a frame to an RGB image in a single unpacking pass"""
+    header, rows = read_frame(data, max_pixels)
+    return rows_to_image(rows, header["width"], header["height"], header["stride"], header["pixel_format"])
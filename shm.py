@@ -0,0 +1,157 @@
+"""
+Shared-memory image handoff for clients on the same host.
+
+The client copies each capture into a slot of a ``ShmFrameRing`` (a
+``/dev/shm`` segment) and sends only a reference: segment name, byte offset,
+shape (height, width, channels), dtype and pixel format. The server maps the
+segment read-only and unpacks the pixels from the mapping straight into an RGB
+image (``read_image``), so the frame never goes through HTTP or an image codec.
+
+Inside containers the server needs the host's ``/dev/shm`` (``ipc: host`` or a
+bind mount). A memfd can be passed as ``memfd:<pid>/<fd>`` when the server may
+read the owning process's ``/proc/<pid>/fd``; anything that is not a memfd is
+rejected.
+"""
+
+import mmap
+import os
+import re
+import stat
+import uuid
+from multiprocessing import shared_memory
+from typing import Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+from rawframe import PIXEL_FORMATS, rows_to_image
+
+SHM_DIR = "/dev/shm"
+_SEGMENT_NAME = re.compile(r"[A-Za-z0-9_.-]+")
+_MEMFD_NAME = re.compile(r"memfd:(\d+)/(\d+)")
+DEFAULT_PIXEL_FORMATS = {3: "RGB", 4: "RGBA"}
+
+
+class ShmError(ValueError):
+    """Invalid or unreadable shared-memory reference"""
+
+
+def segment_path(name: str) -> str:
+    """Filesystem path of a segment name; names cannot leave SHM_DIR"""
+    memfd = _MEMFD_NAME.fullmatch(name)
+    if memfd:
+        return f"/proc/{memfd.group(1)}/fd/{memfd.group(2)}"
+    name = name.lstrip("/")
+    if not _SEGMENT_NAME.fullmatch(name) or name in (".", ".."):
+        raise ShmError(f"Invalid segment name {name!r}")
+    return os.path.join(SHM_DIR, name)
+
+
+def read_image(
+    name: str,
+    offset: int,
+    shape: Sequence[int],
+    dtype: str = "uint8",
+    pixel_format: Optional[str] = None,
+    stride: Optional[int] = None,
+    max_pixels: Optional[int] = None,
+) -> Image.Image:
+    """Map a frame read-only and unpack it to an RGB image.
+
+    The mapping is wrapped as a NumPy view without copying; the unpack to RGB
+    is the only pass over the pixels, after which the mapping is released, so
+    the client may reuse the slot as soon as the request returns. With
+    ``max_pixels``, larger frames are rejected before anything is mapped.
+    """
+    if np.dtype(dtype) != np.uint8:
+        raise ShmError("Only uint8 frames are supported")
+    if len(shape) != 3:
+        raise ShmError("shape must be (height, width, channels)")
+    height, width, channels = (int(v) for v in shape)
+    pixel_format = pixel_format or DEFAULT_PIXEL_FORMATS.get(channels)
+    if pixel_format not in PIXEL_FORMATS or PIXEL_FORMATS[pixel_format][1] != channels:
+        raise ShmError(f"pixel_format must be one of {', '.join(PIXEL_FORMATS)} and match the channel count")
+    stride = stride or width * channels
+    if height <= 0 or width <= 0 or offset < 0 or stride < width * channels:
+        raise ShmError("Invalid shape, offset or stride")
+    if max_pixels is not None and (width * height > max_pixels or stride * height > max_pixels * 4):
+        raise ShmError(f"Frame is larger than {max_pixels} pixels")
+
+    path = segment_path(name)
+    memfd = _MEMFD_NAME.fullmatch(name) is not None
+    try:
+        # /proc/<pid>/fd/<fd> can point at any file the server can read (or a FIFO or device,
+        # which may block or have side effects when opened); only open real memfds
+        if memfd and not os.readlink(path).startswith("/memfd:"):
+            raise ShmError(f"{name!r} is not a memfd")
+        fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            # Checked again on the open descriptor: the fd number may have been reused in between
+            if memfd and not os.readlink(f"/proc/self/fd/{fd}").startswith("/memfd:"):
+                raise ShmError(f"{name!r} is not a memfd")
+            info = os.fstat(fd)
+            if not stat.S_ISREG(info.st_mode):
+                raise ShmError(f"{name!r} is not a shared-memory segment")
+            if offset + stride * height > info.st_size:
+                raise ShmError(f"Frame extends past the end of the segment ({info.st_size} bytes)")
+            mapping = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        raise ShmError(f"Cannot open segment {name!r}: {e.strerror}")
+    try:
+        rows = np.frombuffer(mapping, dtype=np.uint8, count=stride * height, offset=offset).reshape(height, stride)
+        image = rows_to_image(rows, width, height, stride, pixel_format)
+        del rows
+    finally:
+        mapping.close()
+    return image
+
+
+class ShmFrameRing:
+    """Client side: a ring of reusable frame slots in one shared-memory segment.
+
+    ``write`` copies a capture into the next slot and returns the reference to
+    send to ``/process-shm``. Slots are reused round-robin, so keep at most
+    ``slots`` requests in flight.
+    """
+
+    def __init__(self, slot_bytes: int, slots: int = 4, prefix: str = "gui-actor"):
+        self.slot_bytes = int(slot_bytes)
+        self.slots = int(slots)
+        self.segment = shared_memory.SharedMemory(
+            name=f"{prefix}-{os.getpid()}-{uuid.uuid4().hex[:8]}", create=True, size=self.slot_bytes * self.slots
+        )
+        self.next_slot = 0
+
+    @property
+    def name(self) -> str:
+        return self.segment.name.lstrip("/")
+
+    def write(self, pixels: np.ndarray, pixel_format: Optional[str] = None) -> dict:
+        """Copy a (height, width, channels) uint8 frame into the next slot; returns its reference"""
+        pixels = np.asarray(pixels, dtype=np.uint8)
+        if pixels.nbytes > self.slot_bytes:
+            raise ShmError(f"Frame of {pixels.nbytes} bytes does not fit a {self.slot_bytes}-byte slot")
+        offset = self.next_slot * self.slot_bytes
+        self.next_slot = (self.next_slot + 1) % self.slots
+        slot = np.ndarray(pixels.shape, dtype=np.uint8, buffer=self.segment.buf, offset=offset)
+        slot[...] = pixels
+        del slot
+        return {
+            "shm_name": self.name,
+            "offset": offset,
+            "shape": ",".join(str(v) for v in pixels.shape),
+            "dtype": "uint8",
+            "pixel_format": pixel_format or DEFAULT_PIXEL_FORMATS[pixels.shape[2]],
+        }
+
+    def close(self):
+        self.segment.close()
+        self.segment.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
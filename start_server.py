@@ -17,6 +17,8 @@ def main():
     parser.add_argument("--workers", type=int, default=1, help="Number of worker processes (default: 1)")
     parser.add_argument("--log-level", default="info", choices=["debug", "info", "warning", "error"], 
                        help="Log level (default: info)")
+    parser.add_argument("--backend", default=None, choices=["gui_actor_torch", "stub"],
+                       help="Inference backend (default: $INFERENCE_BACKEND or gui_actor_torch)")
     
     args = parser.parse_args()
     
@@ -28,12 +30,15 @@ def main():
     
     # Set environment variables
     os.environ.setdefault("MAX_PIXELS", str(3200 * 1800))
+    if args.backend:
+        os.environ["INFERENCE_BACKEND"] = args.backend
     
     print(f"Starting GUI-Actor FastAPI server...")
     print(f"Host: {args.host}")
     print(f"Port: {args.port}")
     print(f"Workers: {args.workers}")
     print(f"Log level: {args.log_level}")
+    print(f"Backend: {os.environ.get('INFERENCE_BACKEND', 'gui_actor_torch')}")
     print(f"Auto-reload: {args.reload}")
     print()
     
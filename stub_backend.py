@@ -0,0 +1,86 @@
+"""
+Deterministic CPU stand-in for the GUI-Actor model.
+
+Returns predictions shaped like ``batch_inference`` output without torch,
+transformers or a checkpoint, so decoding, resizing, batching, caching and
+encoding can be profiled and load-tested anywhere (``INFERENCE_BACKEND=stub``).
+
+The same screenshot and instruction always give the same point: a smooth
+attention bump on the vision grid at a position derived from a hash of the
+instruction and image size. Each batch sleeps ``latency_ms + per_item_ms *
+len(batch)``, which is how a padded forward pass scales.
+"""
+
+import hashlib
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Vision grid cell in pixels: Qwen2.5-VL patch size (14) x spatial merge size (2)
+CELL = 28
+
+
+def _conversation_parts(conversation):
+    image, instruction = None, ""
+    for message in conversation:
+        for item in message["content"]:
+            if item.get("type") == "image":
+                image = item["image"]
+            elif item.get("type") == "text" and message["role"] == "user":
+                instruction = item["text"]
+    return image, instruction
+
+
+class StubModel:
+    """Batch callable for the scheduler that fakes the pointer head deterministically"""
+
+    def __init__(
+        self,
+        latency_ms: float = 50.0,
+        per_item_ms: float = 5.0,
+        grid: Optional[Tuple[int, int]] = None,
+        topk: int = 3,
+    ):
+        self.latency_ms = latency_ms
+        self.per_item_ms = per_item_ms
+        self.grid = grid
+        self.topk = topk
+
+    def predict(self, image, instruction: str) -> dict:
+        """One ``pred`` dict: ``n_width``/``n_height``, ``attn_scores`` and the top-k points"""
+        n_width, n_height = self.grid or (max(1, image.width // CELL), max(1, image.height // CELL))
+        seed = hashlib.blake2b(f"{instruction}:{image.width}x{image.height}".encode(), digest_size=8).digest()
+        rng = np.random.default_rng(int.from_bytes(seed, "little"))
+
+        # A few Gaussian bumps of decreasing weight; the first is the answer
+        ys, xs = np.mgrid[0:n_height, 0:n_width].astype(np.float32)
+        scores = np.zeros((n_height, n_width), dtype=np.float32)
+        centers = rng.uniform(0, 1, size=(self.topk, 2))
+        for rank, (cx, cy) in enumerate(centers):
+            weight = 1.0 / (rank + 1)
+            scores += weight * np.exp(-(((xs + 0.5) / n_width - cx) ** 2 + ((ys + 0.5) / n_height - cy) ** 2) / 0.002)
+        scores /= scores.sum()
+
+        points = [(float(cx), float(cy)) for cx, cy in centers]
+        values = [float(scores[min(n_height - 1, int(cy * n_height)), min(n_width - 1, int(cx * n_width))]) for cx, cy in centers]
+        return {
+            "n_width": n_width,
+            "n_height": n_height,
+            "attn_scores": scores.reshape(1, -1),
+            "topk_points": points,
+            "topk_values": values,
+            "topk_points_all": points,
+        }
+
+    def run_batch(self, items):
+        """Same item protocol as ``main.run_inference_batch``: conversations or ``{"shared_prefix": [...]}`` jobs"""
+        conversations = sum(len(item["shared_prefix"]) if isinstance(item, dict) else 1 for item in items)
+        time.sleep((self.latency_ms + self.per_item_ms * conversations) / 1000.0)
+        results = []
+        for item in items:
+            if isinstance(item, dict):
+                results.append([self.predict(*_conversation_parts(c)) for c in item["shared_prefix"]])
+            else:
+                results.append(self.predict(*_conversation_parts(item)))
+        return results
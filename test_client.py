@@ -1,11 +1,41 @@
 import requests
 import base64
+import json
 from PIL import Image
 import io
+import time
+import uuid
+import numpy as np
+from email.parser import BytesParser
+from benchmarks.common import parse_server_timing
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 # API base URL
 BASE_URL = "http://localhost:8080"
 
+def log_timing(response, wall_ms):
+    """Print how a request's wall time splits into server time (Server-Timing) and network/transfer time"""
+    timings = parse_server_timing(response.headers.get('Server-Timing', ''))
+    request_id = response.headers.get('X-Request-ID', '-')
+    server_ms = timings.pop('total', None)
+    if server_ms is None:
+        print(f"⏱️  [{request_id}] {wall_ms:.1f}ms (no Server-Timing header)")
+        return
+    stages = ", ".join(f"{name} {ms:.1f}" for name, ms in timings.items())
+    print(f"⏱️  [{request_id}] {wall_ms:.1f}ms = server {server_ms:.1f}ms ({stages}) + network {wall_ms - server_ms:.1f}ms")
+
+def post_timed(path, base_url=None, **kwargs):
+    """POST to the API (``base_url``, default BASE_URL) with a fresh X-Request-ID and log the server vs network time split"""
+    headers = {'X-Request-ID': uuid.uuid4().hex, **kwargs.pop('headers', {})}
+    start = time.perf_counter()
+    response = requests.post(f"{base_url or BASE_URL}{path}", headers=headers, **kwargs)
+    log_timing(response, (time.perf_counter() - start) * 1000)
+    return response
+
 def test_health():
     """Test the health endpoint"""
     response = requests.get(f"{BASE_URL}/health")
@@ -19,16 +49,16 @@ def test_process_with_file(image_path: str, instruction: str):
         files = {'image': f}
         data = {'instruction': instruction}
         
-        response = requests.post(f"{BASE_URL}/process", files=files, data=data)
+        response = post_timed("/process", files=files, data=data, headers=binary_accept_header())
         
         if response.status_code == 200:
-            result = response.json()
+            result = decode_result(response)
             print("Process Response:")
             print(f"Coordinates: {result['coordinates']}")
             print(f"Raw coordinates: {result['raw_coordinates']}")
             print(f"Image size: {result['image_size']}")
-            print(f"Image with point (base64): {result['image_with_point'][:50]}...")
-            print(f"Attention map (base64): {result['attention_map'][:50]}...")
+            print_result_images(result)
+            save_result_images(result, "file_result")
         else:
             print(f"Error: {response.status_code}")
             print(response.text)
@@ -46,36 +76,105 @@ def test_process_with_base64(image_path: str, instruction: str):
         'instruction': instruction
     }
     
-    response = requests.post(f"{BASE_URL}/process-base64", data=data)
+    response = post_timed("/process-base64", data=data, headers=binary_accept_header())
     
     if response.status_code == 200:
-        result = response.json()
+        result = decode_result(response)
         print("Process Base64 Response:")
         print(f"Coordinates: {result['coordinates']}")
         print(f"Raw coordinates: {result['raw_coordinates']}")
         print(f"Image size: {result['image_size']}")
-        print(f"Image with point (base64): {result['image_with_point'][:50]}...")
-        print(f"Attention map (base64): {result['attention_map'][:50]}...")
+        print_result_images(result)
+        save_result_images(result, "base64_result")
     else:
         print(f"Error: {response.status_code}")
         print(response.text)
     print()
 
+def test_process_with_shm(image_path: str, instruction: str, ring=None):
+    """Test the /process-shm endpoint: the frame goes through a shared-memory ring, only its reference over HTTP
+
+    Pass a long-lived ``ring`` (shm.ShmFrameRing) when sending many frames; it is reused round-robin.
+    The server must run on this host, so shm is only imported here.
+    """
+    from shm import ShmFrameRing
+    
+    pixels = np.asarray(Image.open(image_path).convert('RGB'))
+    own_ring = ring is None
+    if own_ring:
+        ring = ShmFrameRing(slot_bytes=pixels.nbytes, slots=2)
+    try:
+        data = ring.write(pixels)
+        data['instruction'] = instruction
+        
+        response = post_timed("/process-shm", data=data, headers=binary_accept_header())
+        
+        if response.status_code == 200:
+            result = decode_result(response)
+            print("Process Shared-Memory Response:")
+            print(f"Coordinates: {result['coordinates']}")
+            print(f"Raw coordinates: {result['raw_coordinates']}")
+            print(f"Image size: {result['image_size']}")
+            print_result_images(result)
+        else:
+            print(f"Error: {response.status_code}")
+            print(response.text)
+        print()
+    finally:
+        if own_ring:
+            ring.close()
+
+def binary_accept_header():
+    """Accept header asking for images as raw bytes instead of base64 in JSON"""
+    return {'Accept': 'application/msgpack' if msgpack is not None else 'multipart/mixed'}
+
+def decode_result(response):
+    """Decode a JSON, msgpack or multipart/mixed /process* response; images come back as raw bytes"""
+    content_type = response.headers.get('content-type', '')
+    if content_type.startswith('application/msgpack'):
+        result = msgpack.unpackb(response.content)
+        for key in ('image_with_point', 'attention_map'):
+            if isinstance(result.get(key), dict):
+                result[key] = result[key]['data']
+        return result
+    if content_type.startswith('multipart/mixed'):
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + response.content)
+        parts = message.get_payload()
+        result = json.loads(parts[0].get_payload(decode=True))
+        for part in parts[1:]:
+            result[part.get_param('name', header='content-disposition')] = part.get_payload(decode=True)
+        return result
+    result = response.json()
+    for key in ('image_with_point', 'attention_map'):
+        if isinstance(result.get(key), str):
+            result[key] = base64.b64decode(result[key].split(',')[1])
+    return result
+
+def image_extension(data):
+    """File extension matching the encoded image bytes (PNG, WebP or JPEG)"""
+    return {'PNG': 'png', 'WEBP': 'webp', 'JPEG': 'jpg'}.get(Image.open(io.BytesIO(data)).format, 'bin')
+
+def print_result_images(result):
+    """Print the size and format of the result images (from decode_result)"""
+    for key in ('image_with_point', 'attention_map'):
+        if result.get(key):
+            print(f"{key}: {len(result[key])} bytes ({image_extension(result[key])})")
+
 def save_result_images(result, output_prefix="output"):
-    """Save the result images to files"""
+    """Save the result images (from decode_result) to files"""
     # Save image with point
     if result.get('image_with_point'):
-        img_data = base64.b64decode(result['image_with_point'].split(',')[1])
-        with open(f"{output_prefix}_with_point.png", 'wb') as f:
-            f.write(img_data)
-        print(f"Saved image with point to {output_prefix}_with_point.png")
+        path = f"{output_prefix}_with_point.{image_extension(result['image_with_point'])}"
+        with open(path, 'wb') as f:
+            f.write(result['image_with_point'])
+        print(f"Saved image with point to {path}")
     
     # Save attention map
     if result.get('attention_map'):
-        img_data = base64.b64decode(result['attention_map'].split(',')[1])
-        with open(f"{output_prefix}_attention_map.png", 'wb') as f:
-            f.write(img_data)
-        print(f"Saved attention map to {output_prefix}_attention_map.png")
+        path = f"{output_prefix}_attention_map.{image_extension(result['attention_map'])}"
+        with open(path, 'wb') as f:
+            f.write(result['attention_map'])
+        print(f"Saved attention map to {path}")
 
 if __name__ == "__main__":
     # Test health endpoint
@@ -87,6 +186,7 @@ if __name__ == "__main__":
     
     # test_process_with_file(image_path, instruction)
     # test_process_with_base64(image_path, instruction)
+    # test_process_with_shm(image_path, instruction)  # server on the same host
     
     print("API Test Client")
     print("To test with your own image:")
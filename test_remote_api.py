@@ -5,13 +5,12 @@ Interactive GUI-Actor API test script with OpenCV display
 
 import requests
 import json
-import base64
 from PIL import Image
-import io
 import os
 from datetime import datetime
 import cv2
 import numpy as np
+from test_client import binary_accept_header, decode_result, image_extension, post_timed
 
 # API endpoint
 BASE_URL = "https://1s5bwa3j8h2jar-8080.proxy.runpod.net"
@@ -72,45 +71,31 @@ def create_test_image():
     return img
 
 def save_result_images(result, output_prefix="output"):
-    """Save the result images to files"""
+    """Save the result images (from decode_result) to files"""
     # Create output directory
     os.makedirs("api_results", exist_ok=True)
     
     # Save image with point
     if result.get('image_with_point'):
-        img_data = base64.b64decode(result['image_with_point'].split(',')[1])
-        output_path = f"api_results/{output_prefix}_with_point.png"
+        output_path = f"api_results/{output_prefix}_with_point.{image_extension(result['image_with_point'])}"
         with open(output_path, 'wb') as f:
-            f.write(img_data)
+            f.write(result['image_with_point'])
         print(f"✅ Saved image with point to {output_path}")
     
     # Save attention map
     if result.get('attention_map'):
-        img_data = base64.b64decode(result['attention_map'].split(',')[1])
-        output_path = f"api_results/{output_prefix}_attention_map.png"
+        output_path = f"api_results/{output_prefix}_attention_map.{image_extension(result['attention_map'])}"
         with open(output_path, 'wb') as f:
-            f.write(img_data)
+            f.write(result['attention_map'])
         print(f"✅ Saved attention map to {output_path}")
 
-def base64_to_cv2(base64_string):
-    """Convert base64 image string to OpenCV format"""
-    if not base64_string:
+def bytes_to_cv2(img_data):
+    """Convert encoded image bytes (PNG, WebP or JPEG) to OpenCV format"""
+    if not img_data:
         return None
     
-    # Remove data URL prefix if present
-    if base64_string.startswith('data:image'):
-        base64_string = base64_string.split(',')[1]
-    
-    # Decode base64
-    img_data = base64.b64decode(base64_string)
-    
-    # Convert to PIL Image
-    pil_image = Image.open(io.BytesIO(img_data))
-    
-    # Convert PIL to OpenCV format (RGB to BGR)
-    cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-    
-    return cv_image
+    # Decode straight to BGR
+    return cv2.imdecode(np.frombuffer(img_data, dtype=np.uint8), cv2.IMREAD_COLOR)
 
 def display_results(original_image, result_image, attention_map, coordinates):
     """Display results using OpenCV"""
@@ -118,11 +103,11 @@ def display_results(original_image, result_image, attention_map, coordinates):
     original_cv = cv2.cvtColor(np.array(original_image), cv2.COLOR_RGB2BGR)
     
     # Convert result images
-    result_cv = base64_to_cv2(result_image)
+    result_cv = bytes_to_cv2(result_image)
     
     # Handle case where attention_map might be None (fast mode)
     if attention_map is not None:
-        attention_cv = base64_to_cv2(attention_map)
+        attention_cv = bytes_to_cv2(attention_map)
     else:
         attention_cv = None
     
@@ -205,10 +190,12 @@ def test_process_with_base64():
             files = {'image': ('test_image.png', f, 'image/png')}
             data = {'instruction': 'Click on the red rectangle'}
             
-            response = requests.post(
-                f"{BASE_URL}/process",
+            response = post_timed(
+                "/process",
+                base_url=BASE_URL,
                 files=files,
                 data=data,
+                headers=binary_accept_header(),
                 timeout=30
             )
         
@@ -219,13 +206,13 @@ def test_process_with_base64():
         print(f"Status Code: {response.status_code}")
         
         if response.status_code == 200:
-            result = response.json()
+            result = decode_result(response)
             print("✅ Process successful!")
             print(f"Coordinates: {result.get('coordinates', 'N/A')}")
             print(f"Raw coordinates: {result.get('raw_coordinates', 'N/A')}")
             print(f"Image size: {result.get('image_size', 'N/A')}")
-            print(f"Image with point (base64 length): {len(result.get('image_with_point', ''))}")
-            print(f"Attention map (base64 length): {len(result.get('attention_map', ''))}")
+            print(f"Image with point (bytes): {len(result.get('image_with_point') or b'')}")
+            print(f"Attention map (bytes): {len(result.get('attention_map') or b'')}")
             
             # Save result images
             save_result_images(result, f"result_{timestamp}")
@@ -260,17 +247,19 @@ def test_process_with_file():
             files = {'image': ('upload_test.png', f, 'image/png')}
             data = {'instruction': 'Click on the red rectangle'}
             
-            response = requests.post(
-                f"{BASE_URL}/process",
+            response = post_timed(
+                "/process",
+                base_url=BASE_URL,
                 files=files,
                 data=data,
+                headers=binary_accept_header(),
                 timeout=30
             )
         
         print(f"Status Code: {response.status_code}")
         
         if response.status_code == 200:
-            result = response.json()
+            result = decode_result(response)
             print("✅ Process successful!")
             print(f"Coordinates: {result.get('coordinates', 'N/A')}")
             print(f"Raw coordinates: {result.get('raw_coordinates', 'N/A')}")
@@ -330,10 +319,12 @@ def process_screenshot_with_instruction(screenshot, instruction, fast_mode=False
             data = {'instruction': instruction, 'fast_mode': fast_mode}
             
             print(f"📤 Sending request to {BASE_URL}/process")
-            response = requests.post(
-                f"{BASE_URL}/process",
+            response = post_timed(
+                "/process",
+                base_url=BASE_URL,
                 files=files,
                 data=data,
+                headers=binary_accept_header(),
                 timeout=30
             )
         
@@ -344,7 +335,7 @@ def process_screenshot_with_instruction(screenshot, instruction, fast_mode=False
         print(f"📥 Response status: {response.status_code}")
         
         if response.status_code == 200:
-            return response.json()
+            return decode_result(response)
         else:
             print(f"❌ API Error: {response.status_code} - {response.text}")
             return None